@@ -56,6 +56,7 @@ def get_robot_state():
 
 def is_robot_available():
     state = get_robot_state()
+    # is_all_done() voit aussi les frames en file, l'instantané n'est republié qu'après une frame
     return state in [RobotState.IDLE, RobotState.AUTONOMOUS] and my_dog.is_all_done()
 
 # ===== OPTIMISATION DES COMMANDES =====
@@ -93,7 +94,13 @@ def calculate_direction_optimized(kx, ky):
     speed = int(MIN_SPEED + (MAX_SPEED - MIN_SPEED) * min(kr, 1.0))
     return direction, speed
 
-def execute_movement_command(direction, speed):
+def calculate_velocity_optimized(kx, ky):
+    """Vecteur vitesse continu (vx, yaw_rate) pour my_dog.walk_velocity()"""
+    vx = max(-1.0, min(ky, 1.0))
+    yaw_rate = max(-1.0, min(-kx, 1.0))  # yaw_rate positif = virage à gauche
+    return vx, yaw_rate
+
+def execute_movement_command(direction, speed, velocity=None):
     """Exécution optimisée des commandes de mouvement"""
     try:
         set_robot_state(RobotState.MOVING)
@@ -103,7 +110,10 @@ def execute_movement_command(direction, speed):
             set_robot_state(RobotState.IDLE)
         else:
             # Pas de wait_all_done() ici pour éviter le blocage
-            my_dog.do_action(direction, speed=speed, step_count=1)
+            if velocity is not None:
+                my_dog.walk_velocity(*velocity, speed=speed, cycles=1)
+            else:
+                my_dog.move_gait(direction, speed=speed, cycles=1)
         
         return True
     except Exception as e:
@@ -127,7 +137,8 @@ def command_processor():
                 kx, ky = cmd_data
                 direction, speed = calculate_direction_optimized(kx, ky)
                 
-                if execute_movement_command(direction, speed):
+                velocity = calculate_velocity_optimized(kx, ky)
+                if execute_movement_command(direction, speed, velocity):
                     last_movement_params = (kx, ky)
                     last_command_time = current_time
             
@@ -207,6 +218,16 @@ def autonomous_behavior_optimized():
             # Attente non-bloquante
             while time.time() - start_time < duration and autonomous_mode:
                 sleep(0.2)
+
+            # Repos imposé par le niveau de batterie
+            rest = my_dog.autonomous_rest(time.time() - start_time)
+            if rest is None:
+                print("[AUTO] Batterie critique, arrêt du mode autonome")
+                autonomous_mode = False
+                break
+            rest_end = time.time() + rest
+            while time.time() < rest_end and autonomous_mode:
+                sleep(0.2)
     
     set_robot_state(RobotState.IDLE)
     print("[AUTO] Mode autonome arrêté")
@@ -352,12 +373,22 @@ def set_autonomous_mode_optimized():
 def get_status_optimized():
     try:
         state = get_robot_state()
+        # instantané cohérent publié par les threads de contrôle
+        snapshot = my_dog.get_state()
         return jsonify({
             'status': 'connected',
             'robot_state': state.value,
             'autonomous_mode': autonomous_mode,
             'queue_size': command_queue.qsize(),
-            'is_available': is_robot_available()
+            'is_available': is_robot_available(),
+            'state_version': snapshot.version,
+            'legs_depth': snapshot.legs_depth,
+            'head_angles': snapshot.head_angles,
+            'pitch': round(snapshot.pitch, 1),
+            'roll': round(snapshot.roll, 1),
+            'battery_voltage': snapshot.battery_voltage,
+            'battery_trend': snapshot.battery_trend,
+            'battery_level': snapshot.battery_level
         })
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)})
@@ -365,9 +396,11 @@ def get_status_optimized():
 @app.route('/sensor_data', methods=['GET'])
 def get_sensor_data_optimized():
     try:
-        distance = my_dog.read_distance()
+        snapshot = my_dog.get_state()
+        distance = snapshot.distance
         return jsonify({
             'distance': round(distance, 1) if distance else None,
+            'distance_age': round(snapshot.timestamp - snapshot.distance_time, 2) if snapshot.distance_time else None,
             'robot_state': get_robot_state().value,
             'autonomous_mode': autonomous_mode
         })
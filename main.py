@@ -134,6 +134,15 @@ def calculate_direction_from_kx_ky(kx, ky):
     else:
         return "stop", 0
 
+def calculate_velocity_from_kx_ky(kx, ky):
+    """
+    Convertit kx/ky en vecteur vitesse pour my_dog.walk_velocity()
+    ky: avant/arrière, kx: virage (droite positif)
+    """
+    vx = max(-1.0, min(ky, 1.0))
+    yaw_rate = max(-1.0, min(-kx, 1.0))  # yaw_rate positif = virage à gauche
+    return vx, yaw_rate
+
 # Flask App
 app = Flask(__name__)
 last_command = None
@@ -159,7 +168,8 @@ def handle_command():
     """
     global last_command
     
-    if not my_dog.is_legs_done():
+    # une marche en cours n'est pas bloquante, move_gait() change d'allure à la volée
+    if not my_dog.is_legs_done() and not my_dog.is_gait_running():
         return jsonify({'status': 'busy', 'message': 'Robot occupé'})
     
     data = request.get_json()
@@ -170,6 +180,8 @@ def handle_command():
         angle = float(data.get('angle', 0))
         intensity = float(data.get('intensity', 0))
         direction, value = calculate_direction_from_angle(angle, intensity)
+        kx = intensity * sin(angle * pi / 180)
+        ky = intensity * cos(angle * pi / 180)
         print(f"HTML Format: angle={angle}°, intensity={intensity} → {direction}")
         
     elif 'kx' in data and 'ky' in data:
@@ -190,18 +202,11 @@ def handle_command():
         return jsonify({'status': 'error', 'message': f'Commande {direction} non reconnue.'})
     
     try:
-        if direction != last_command and last_command not in [None, "stop"]:
-            my_dog.legs_stop()
-            my_dog.wait_all_done()
-        
-        if direction == "forward":
-            my_dog.do_action('forward', speed=speed)
-        elif direction == "backward":
-            my_dog.do_action('backward', speed=speed)
-        elif direction == "turn_left":
-            my_dog.do_action('turn_left', speed=speed)
-        elif direction == "turn_right":
-            my_dog.do_action('turn_right', speed=speed)
+        # Trajectoire continue: la direction sert à la zone morte et au message,
+        # la marche suit le vecteur vitesse du joystick sans arrêt entre les commandes
+        if direction in ["forward", "backward", "turn_left", "turn_right"]:
+            vx, yaw_rate = calculate_velocity_from_kx_ky(kx, ky)
+            my_dog.walk_velocity(vx, yaw_rate, speed=speed, cycles=1)
         elif direction == "stop":
             my_dog.legs_stop()
             my_dog.wait_all_done()
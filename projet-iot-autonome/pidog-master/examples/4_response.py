@@ -5,6 +5,8 @@ from math import sin
 from preset_actions import bark_action
 
 my_dog = Pidog()
+# touches are queued from the pin edges, no stroke missed between two loops
+events = my_dog.enable_events(touch=True, sound_direction=False)
 sleep(0.1)
 
 def lean_forward():
@@ -31,8 +33,13 @@ def alert():
     my_dog.do_action('stand', step_count=1, speed=70)
     my_dog.rgb_strip.set_mode('breath', color='pink', bps=1, brightness=0.8)
     while True:
+        touch = 'N'
+        event = events.get(timeout=0)
+        while event is not None:
+            touch = event.value
+            event = events.get(timeout=0)
         print(
-            f'distance.value: {round(my_dog.read_distance(), 2)} cm, touch {my_dog.dual_touch.read()}')
+            f'distance.value: {round(my_dog.read_distance(), 2)} cm, touch {touch}')
         # alert
         if my_dog.read_distance() < 15 and my_dog.read_distance() > 1:
             my_dog.head_move([[0, 0, 0]], immediately=True, speed=90)
@@ -46,7 +53,7 @@ def alert():
             my_dog.do_action('stand', step_count=1, speed=90)
             sleep(0.5)
         # relax
-        if my_dog.dual_touch.read() != 'N':
+        if touch != 'N':
             if len(my_dog.head_action_buffer) < 2:
                 head_nod(1)
                 my_dog.do_action('wag_tail', step_count=10, speed=80)
@@ -1,6 +1,6 @@
 #!/usr/bin/env python3
 from pidog import Pidog
-from time import sleep
+from time import sleep, time
 
 my_dog = Pidog()
 sleep(0.1)
@@ -26,13 +26,20 @@ def be_picked_up():
     downflag = False
 
     stand()
+    last_time = time()
 
     while True:
-        ax = my_dog.accData[0]
-        print('ax: %s, is up: %s' % (ax, isUp))
+        # every sample since the last check, so that short peaks are not missed
+        timestamps, acc, _ = my_dog.imu_buffer.samples_since(last_time)
+        if len(timestamps) == 0:
+            sleep(0.02)
+            continue
+        last_time = timestamps[-1]
+        ax = acc[:, 0]
+        print('ax: %s ~ %s, is up: %s' % (ax.min(), ax.max(), isUp))
 
         # gravity : 1G = -16384
-        if ax < -18000: # if down, acceleration is in the same direction as gravity, ax < -1G
+        if ax.min() < -18000: # if down, acceleration is in the same direction as gravity, ax < -1G
             my_dog.body_stop()
             if upflag == False:
                 upflag = True
@@ -41,7 +48,7 @@ def be_picked_up():
                 downflag = False
                 stand()
 
-        if ax > -13000: # if up, acceleration is the opposite of gravity, ax will > -1G
+        if ax.max() > -13000: # if up, acceleration is the opposite of gravity, ax will > -1G
             my_dog.body_stop()
             if upflag == True:
                 isUp = True
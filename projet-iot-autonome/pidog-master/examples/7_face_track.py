@@ -5,6 +5,8 @@ from vilib import Vilib
 from preset_actions import bark
 
 my_dog = Pidog()
+# sound directions tracked in the background, ignored while the servos move
+my_dog.start_sound_tracking(half_life=1.0)
 sleep(0.1)
 
 def face_track():
@@ -23,17 +25,18 @@ def face_track():
     my_dog.head_move([[yaw, 0, pitch]], pitch_comp=-40, immediately=True, speed=80)
     my_dog.wait_all_done()
     sleep(0.5)
-    # Cleanup sound detection by servos moving
-    if my_dog.ears.isdetected():    
-        direction = my_dog.ears.read()
+    heard_time = 0
 
     while True:
         if flag == False:
             my_dog.rgb_strip.set_mode('breath', 'pink', bps=1)
         # If heard somthing, turn to face it
-        if my_dog.ears.isdetected():
+        bearing, confidence = my_dog.sound_bearing()
+        last_heard = my_dog.ears.histogram.last_time
+        if bearing is not None and confidence > 0.5 and last_heard != heard_time:
+            heard_time = last_heard
             flag = False
-            direction = my_dog.ears.read()
+            direction = int(bearing)
             pitch = 0
             if direction > 0 and direction < 160:
                 yaw = -direction
@@ -56,8 +59,6 @@ def face_track():
             flag = True
             my_dog.do_action('wag_tail', step_count=2, speed=100)
             bark(my_dog, [yaw, 0, 0], pitch_comp=-40, volume=80)
-            if my_dog.ears.isdetected():
-                direction = my_dog.ears.read()
 
         if ex > 15 and yaw > -80:
             yaw -= 0.5 * int(ex/30.0+0.5)
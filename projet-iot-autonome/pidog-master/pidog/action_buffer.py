@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+import threading
+from collections import deque
+
+
+class _Stream():
+    """
+    Lazily pulled frames source, at most `lookahead` frames are materialized
+    """
+
+    def __init__(self, source, lookahead):
+        self.source = source
+        self.iterator = iter(source)
+        self.lookahead = lookahead
+        self.pending = deque()
+        self.exhausted = False
+
+    def fill(self):
+        """
+        Pull frames up to the lookahead, return the number of frames pulled
+        """
+        count = 0
+        while not self.exhausted and len(self.pending) < self.lookahead:
+            try:
+                self.pending.append(next(self.iterator))
+                count += 1
+            except StopIteration:
+                self.exhausted = True
+            except Exception as e:
+                # a broken source must not kill the action thread,
+                # error() imported here, pidog.py imports this module
+                from .pidog import error
+                error(f'\rActionBuffer stream Exception:{e}')
+                self.exhausted = True
+        return count
+
+
+class ActionBuffer():
+    """
+    Frame queue of one body part (legs, head or tail)
+
+    The action thread blocks in get() while the buffer is empty instead of
+    polling, and callers block in wait_done() until the last frame has been
+    executed.
+
+    Besides lists of frames, iterators can be queued with extend_stream(),
+    they are pulled lazily by the action thread, so that a long (or endless)
+    trajectory takes constant memory.
+
+    :param lookahead: max frames materialized from a stream
+    :type lookahead: int
+    """
+
+    DEFAULT_LOOKAHEAD = 2
+
+    def __init__(self, lookahead=DEFAULT_LOOKAHEAD):
+        self.lookahead = lookahead
+        # frames and _Stream objects, in order
+        self._entries = deque()
+        # number of frames materialized in _entries
+        self._size = 0
+        self._cond = threading.Condition()
+        self._drained = threading.Event()
+        self._drained.set()
+        self._in_flight = False
+        self._generation = 0
+        # set by close(), get() returns None right away until reopen()
+        self.closed = False
+        self._listeners = []
+
+    def add_listener(self, event):
+        """
+        Set a threading.Event whenever frames are queued or on interrupt(),
+        so that one thread can wait on several buffers
+        """
+        self._listeners.append(event)
+
+    def _notify_listeners(self):
+        for event in self._listeners:
+            event.set()
+
+    def __len__(self):
+        """
+        Number of frames queued, frames of streams not pulled yet are not counted
+        """
+        return self._size
+
+    def _queued(self):
+        self._drained.clear()
+        self._cond.notify()
+
+    def extend(self, frames):
+        """
+        Append frames to the end of the buffer
+
+        :param frames: list of angles lists
+        :type frames: list
+        """
+        with self._cond:
+            count = len(self._entries)
+            self._entries.extend(frames)
+            count = len(self._entries) - count
+            if count > 0:
+                self._size += count
+                self._queued()
+        self._notify_listeners()
+
+    def extend_stream(self, source):
+        """
+        Append an iterable of frames, pulled lazily by get()
+
+        :param source: iterable of angles lists, may be endless
+        :type source: iterable
+        """
+        with self._cond:
+            self._entries.append(_Stream(source, self.lookahead))
+            self._queued()
+        self._notify_listeners()
+
+    def has_stream(self, source):
+        """
+        Whether the iterable queued by extend_stream() is still in the buffer
+        """
+        with self._cond:
+            for entry in self._entries:
+                if isinstance(entry, _Stream) and entry.source is source:
+                    return True
+            return False
+
+    def clear(self):
+        """
+        Drop all pending frames and streams, the frame being executed (if any) still completes
+        """
+        with self._cond:
+            self._entries.clear()
+            self._size = 0
+            if not self._in_flight:
+                self._drained.set()
+
+    def _pop(self):
+        # pop the next frame, None if the buffer is empty
+        while len(self._entries) > 0:
+            entry = self._entries[0]
+            if not isinstance(entry, _Stream):
+                self._size -= 1
+                return self._entries.popleft()
+            self._size += entry.fill()
+            if len(entry.pending) > 0:
+                self._size -= 1
+                return entry.pending.popleft()
+            self._entries.popleft()
+        return None
+
+    def get(self, timeout=None):
+        """
+        Pop the next frame, block while the buffer is empty
+
+        :param timeout: max seconds to wait, None for no limit
+        :type timeout: float
+        :return: next frame, or None if timed out or interrupted
+        """
+        with self._cond:
+            if self.closed:
+                return None
+            generation = self._generation
+            while True:
+                frame = self._pop()
+                if frame is not None:
+                    self._in_flight = True
+                    return frame
+                if not self._in_flight:
+                    # an exhausted stream was the last entry
+                    self._drained.set()
+                if generation != self._generation or self.closed:
+                    return None
+                if not self._cond.wait(timeout):
+                    return None
+
+    def _drop_exhausted(self):
+        # pull the next stream ahead, so that a stream ending with the frame
+        # just executed reads as drained right away
+        while len(self._entries) > 0 and isinstance(self._entries[0], _Stream):
+            entry = self._entries[0]
+            self._size += entry.fill()
+            if len(entry.pending) > 0:
+                return
+            self._entries.popleft()
+
+    def task_done(self):
+        """
+        Mark the last frame returned by get() as executed
+        """
+        with self._cond:
+            self._in_flight = False
+            self._drop_exhausted()
+            if len(self._entries) == 0:
+                self._drained.set()
+
+    def interrupt(self):
+        """
+        Wake up the threads blocked in get(), they will return None
+        """
+        with self._cond:
+            self._generation += 1
+            self._cond.notify_all()
+        self._notify_listeners()
+
+    def close(self):
+        """
+        Make get() return None until reopen(), even if called after this,
+        so that a thread about to block in get() still stops
+        """
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+        self._notify_listeners()
+
+    def reopen(self):
+        """
+        Undo close(), before the action threads are started again
+        """
+        with self._cond:
+            self.closed = False
+
+    def is_done(self):
+        return self._drained.is_set()
+
+    def wait_done(self, timeout=None):
+        """
+        Block until all the frames have been executed
+
+        :param timeout: max seconds to wait, None for no limit
+        :type timeout: float
+        :return: True if drained, False if timed out
+        :rtype: bool
+        """
+        return self._drained.wait(timeout)
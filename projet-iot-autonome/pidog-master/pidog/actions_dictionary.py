@@ -3,36 +3,187 @@ from .pidog import Pidog
 from .walk import Walk
 from .trot import Trot
 from math import sin
+from functools import lru_cache
+import threading
+import numpy as np
+
+VELOCITY_RESOLUTION = 0.05  # quantization step of the velocity gaits
+VELOCITY_CACHE_SIZE = 16
+
+
+@lru_cache(maxsize=VELOCITY_CACHE_SIZE)
+def _velocity_gait(vx_steps, yaw_steps):
+    # vx, yaw_rate in VELOCITY_RESOLUTION steps, so that close velocities share an entry
+    vx = vx_steps * VELOCITY_RESOLUTION
+    yaw_rate = yaw_steps * VELOCITY_RESOLUTION
+    params = Walk.velocity_params(vx, yaw_rate)
+    if params is None:
+        return None
+    fb, step_width, leg_step_scales = params
+    walk = Walk(fb=fb, lr=Walk.STRAIGHT, step_width=step_width, leg_step_scales=leg_step_scales)
+    coords = np.array(walk.get_coords(), dtype=float)
+    coords.flags.writeable = False
+    angles = tuple(tuple(frame) for frame in Pidog.legs_angle_calculation_batch(coords).tolist())
+    return f'velocity({vx:+.2f}, {yaw_rate:+.2f})', coords, angles
 
 # ActionDict: - > angles_dict
 class ActionDict(dict):
 
+    # gait actions, name: (gait class, fb, lr)
+    GAITS = {
+        'forward': (Walk, Walk.FORWARD, Walk.STRAIGHT),
+        'backward': (Walk, Walk.BACKWARD, Walk.STRAIGHT),
+        'turn_left': (Walk, Walk.FORWARD, Walk.LEFT),
+        'turn_right': (Walk, Walk.FORWARD, Walk.RIGHT),
+        'trot': (Trot, Trot.FORWARD, Trot.STRAIGHT),
+    }
+
     def __init__(self, *args, **kwargs):
         dict.__init__(self, *args, **kwargs)
         super().__init__()
         self.barycenter = -15
         self.height = 95
 
+        # compiled gaits cache, (name, height, barycenter, gait params): frames
+        self._compiled = {}
+        # legs coords the angles are computed from, (name, height, barycenter, gait params): array
+        self._compiled_coords = {}
+        self._compiled_lock = threading.Lock()
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+        # action name -> property getter, replaces eval()
+        self._dispatch = {}
+        for cls in reversed(type(self).__mro__):
+            for name, attr in vars(cls).items():
+                if isinstance(attr, property):
+                    self._dispatch[name] = attr.fget
+
     def __getitem__(self, item):
-        return eval("self.%s" % item.replace(" ", "_"))
+        try:
+            getter = self._dispatch[item.replace(" ", "_")]
+        except KeyError:
+            raise KeyError(item)
+        return getter(self)
 
     def set_height(self, height):
-        if height in range(20, 95):
+        if height in range(20, 95) and height != self.height:
             self.height = height
+            self.clear_cache()
 
     def set_barycenter(self, offset):
-        if offset in range(-60, 60):
+        if offset in range(-60, 60) and offset != self.barycenter:
             self.barycenter = offset
+            self.clear_cache()
+
+    # compiled gaits cache
+    def clear_cache(self):
+        with self._compiled_lock:
+            self._compiled.clear()
+            self._compiled_coords.clear()
+
+    def cache_info(self):
+        """
+        Compiled gaits cache statistics
+
+        :return: {'hits': int, 'misses': int, 'size': int}
+        :rtype: dict
+        """
+        return {'hits': self.cache_hits,
+                'misses': self.cache_misses,
+                'size': len(self._compiled)}
+
+    def _compile(self, key, calculate):
+        with self._compiled_lock:
+            frames = self._compiled.get(key)
+            if frames is not None:
+                self.cache_hits += 1
+                return frames
+            self.cache_misses += 1
+        # immutable, so that the same frames can be queued many times
+        frames = tuple(tuple(angles) for angles in calculate())
+        with self._compiled_lock:
+            self._compiled[key] = frames
+        return frames
+
+    def compiled_gait_coords(self, name):
+        """
+        Precomputed legs coords of a gait action
+
+        :param name: gait name, one of GAITS
+        :type name: str
+        :return: read-only array, shape (frames, 4, 2)
+        :rtype: numpy.ndarray
+        """
+        gait_class, fb, lr = self.GAITS[name]
+        key = (name, self.height, self.barycenter, gait_class.gait_params(fb, lr))
+        with self._compiled_lock:
+            coords = self._compiled_coords.get(key)
+        if coords is None:
+            coords = np.array(gait_class(fb=fb, lr=lr).get_coords(), dtype=float)
+            coords.flags.writeable = False
+            with self._compiled_lock:
+                self._compiled_coords[key] = coords
+        return coords
+
+    def compiled_gait(self, name):
+        """
+        Precomputed legs angles of a gait action
+
+        :param name: gait name, one of GAITS
+        :type name: str
+        :return: tuple of 8-angles tuples
+        :rtype: tuple
+        """
+        gait_class, fb, lr = self.GAITS[name]
+        key = (name, self.height, self.barycenter, gait_class.gait_params(fb, lr))
+
+        def calculate():
+            coords = self.compiled_gait_coords(name)
+            return Pidog.legs_angle_calculation_batch(coords).tolist()
+
+        return self._compile(key, calculate)
+
+    def velocity_gait(self, vx, yaw_rate):
+        """
+        Walk gait of a velocity vector, the last VELOCITY_CACHE_SIZE
+        velocities used are cached
+
+        :param vx: forward speed, -1 to 1, negative is backward
+        :type vx: float
+        :param yaw_rate: turning speed, -1 to 1, positive turns left
+        :type yaw_rate: float
+        :return: gait name, read-only coords (frames, 4, 2), tuple of 8-angles tuples,
+                 or None if not moving
+        :rtype: tuple
+        """
+        vx = max(-1.0, min(vx, 1.0))
+        yaw_rate = max(-1.0, min(yaw_rate, 1.0))
+        return _velocity_gait(round(vx / VELOCITY_RESOLUTION),
+                              round(yaw_rate / VELOCITY_RESOLUTION))
+
+    def velocity_cache_info(self):
+        """
+        Velocity gaits LRU cache statistics
+
+        :return: {'hits': int, 'misses': int, 'size': int}
+        :rtype: dict
+        """
+        info = _velocity_gait.cache_info()
+        return {'hits': info.hits,
+                'misses': info.misses,
+                'size': info.currsize}
 
     # 站 stand
     @property
     def stand(self):
         x = self.barycenter
         y = 95
-        return [
+        key = ('stand', self.height, self.barycenter)
+        return list(self._compile(key, lambda: [
             Pidog.legs_angle_calculation(
                 [[x, y], [x, y], [x+20, y-5], [x+20, y-5]]),
-        ], 'legs'
+        ])), 'legs'
 
     # 坐 sit
     @property
@@ -58,52 +209,27 @@ class ActionDict(dict):
     # forward
     @property
     def forward(self):
-        data = []
-        forward = Walk(fb=Walk.FORWARD, lr=Walk.STRAIGHT)
-        coords = forward.get_coords()
-        for coord in coords:
-            data.append(Pidog.legs_angle_calculation(coord))
-        return data, 'legs'
+        return list(self.compiled_gait('forward')), 'legs'
 
     # backward
     @property
     def backward(self):
-        data = []
-        backward = Walk(fb=Walk.BACKWARD, lr=Walk.STRAIGHT)
-        coords = backward.get_coords()
-        for coord in coords:
-            data.append(Pidog.legs_angle_calculation(coord))
-        return data, 'legs'
+        return list(self.compiled_gait('backward')), 'legs'
 
     # turn_left
     @property
     def turn_left(self):
-        data = []
-        turn_left = Walk(fb=Walk.FORWARD, lr=Walk.LEFT)
-        coords = turn_left.get_coords()
-        for coord in coords:
-            data.append(Pidog.legs_angle_calculation(coord))
-        return data, 'legs'
+        return list(self.compiled_gait('turn_left')), 'legs'
 
     # turn_right
     @property
     def turn_right(self):
-        data = []
-        turn_right = Walk(fb=Walk.FORWARD, lr=Walk.RIGHT)
-        coords = turn_right.get_coords()
-        for coord in coords:
-            data.append(Pidog.legs_angle_calculation(coord))
-        return data, 'legs'
+        return list(self.compiled_gait('turn_right')), 'legs'
 
     # 小跑 trot
     @property
     def trot(self):
-        data = []
-        trot = Trot(Trot.FORWARD, Trot.STRAIGHT)
-        coords = trot.get_coords()
-        for coord in coords:
-            data.append(Pidog.legs_angle_calculation(coord))
-        return data, 'legs'
+        return list(self.compiled_gait('trot')), 'legs'
 
     # 伸懒腰 stretch
     @property
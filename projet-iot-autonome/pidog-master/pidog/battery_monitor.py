@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+from collections import namedtuple
+import threading
+
+# raw and smoothed voltage (V), trend (V/min), power level
+BatterySample = namedtuple('BatterySample', ('raw', 'voltage', 'trend', 'level'))
+
+
+class BatteryMonitor():
+    """
+    Smoothed battery voltage, trend and power level from low-rate samples
+
+    The servos make the voltage sag for a moment under load, the moving
+    average keeps these dips from switching the level, and the hysteresis
+    keeps the level from flapping around a threshold.
+
+    :param alpha: weight of a new sample in the moving average
+    :type alpha: float
+    :param trend_alpha: weight of a new slope in the trend average
+    :type trend_alpha: float
+    """
+
+    # 2S li-ion pack, 8.4 V full
+    LEVELS = (
+        ('critical', 6.6),  # below this the robot browns out under load
+        ('low', 7.0),
+        ('normal', float('inf')),
+    )
+    HYSTERESIS = 0.1  # V, to climb back to a higher level
+
+    # motion and light limits of each level,
+    # legs_speed: max legs speed, brightness: max rgb brightness,
+    # duty: max fraction of the time spent moving in autonomous mode
+    POWER_LIMITS = {
+        'normal': {'legs_speed': 100, 'brightness': 1.0, 'duty': 1.0},
+        'low': {'legs_speed': 70, 'brightness': 0.5, 'duty': 0.5},
+        'critical': {'legs_speed': 40, 'brightness': 0.1, 'duty': 0.0},
+    }
+
+    def __init__(self, alpha=0.1, trend_alpha=0.1):
+        self.alpha = alpha
+        self.trend_alpha = trend_alpha
+        self.raw = None
+        self.voltage = None
+        self.trend = 0.0
+        self.level = 'normal'
+        self.timestamp = None
+        self._lock = threading.Lock()
+        self._callbacks = []
+
+    def update(self, raw, timestamp):
+        '''
+        Add a sample
+
+        :param raw: voltage read, V
+        :param timestamp: time() of the read
+        :return: the new state
+        :rtype: BatterySample
+        '''
+        with self._lock:
+            if self.voltage is None:
+                self.voltage = raw
+            else:
+                previous = self.voltage
+                self.voltage += (raw - self.voltage) * self.alpha
+                dt = timestamp - self.timestamp
+                if dt > 0:
+                    slope = (self.voltage - previous) / dt * 60
+                    self.trend += (slope - self.trend) * self.trend_alpha
+            self.raw = raw
+            self.timestamp = timestamp
+            old_level = self.level
+            self.level = self._level(self.voltage, old_level)
+            sample = BatterySample(raw, self.voltage, self.trend, self.level)
+            callbacks = list(self._callbacks) if self.level != old_level else []
+        for callback in callbacks:
+            callback(old_level, self.level)
+        return sample
+
+    def _level(self, voltage, current):
+        names = [name for name, _ in self.LEVELS]
+        for name, threshold in self.LEVELS:
+            if voltage < threshold:
+                break
+        # going up needs a margin above the threshold of the current level
+        if names.index(name) > names.index(current):
+            threshold = dict(self.LEVELS)[current]
+            if voltage < threshold + self.HYSTERESIS:
+                return current
+        return name
+
+    def limits(self):
+        '''
+        Power limits of the current level, see POWER_LIMITS
+        '''
+        return self.POWER_LIMITS[self.level]
+
+    def add_callback(self, callback):
+        '''
+        Call a function on level changes
+
+        :param callback: function taking the old and the new level
+        '''
+        self._callbacks.append(callback)
+
+    def read(self):
+        '''
+        :return: the last state, None before the first sample
+        :rtype: BatterySample
+        '''
+        with self._lock:
+            if self.voltage is None:
+                return None
+            return BatterySample(self.raw, self.voltage, self.trend, self.level)
@@ -1,11 +1,13 @@
 #!/usr/bin/env python3
 from robot_hat import Pin
 import time
+import threading
 
 
 class DualTouch():
 
     SLIDE_MAX_INTERVAL = 0.5  # second, Maximum effective interval for sliding detection
+    BOUNCE_TIME = 50  # ms, debounce of the edge callbacks
 
     def __init__(self, sw1='D2', sw2='D3'):
 
@@ -13,6 +15,11 @@ class DualTouch():
         self.touch_R = Pin(sw2, mode=Pin.IN, pull=Pin.PULL_UP)
         self.last_touch = 'N'
         self.last_touch_time = 0
+        # edge callbacks state, separate from read() polling
+        self._callbacks = []
+        self._edge_touch = 'N'
+        self._edge_time = 0
+        self._edge_lock = threading.Lock()
 
     # def read(self):
     #     if self.touch_L.value() == 1:
@@ -48,4 +55,33 @@ class DualTouch():
             self.last_touch_time = time.time()
             self.last_touch = 'R'
             return val
-        return 'N'
\ No newline at end of file
+        return 'N'
+
+    def add_callback(self, callback):
+        '''
+        Call a function on every touch, from the pin rising edges instead of
+        polling, slides are detected from the edge times
+
+        :param callback: function taking the touch style ('L', 'R', 'LS', 'RS') and time() of the edge
+        '''
+        if len(self._callbacks) == 0:
+            self.touch_L.irq(handler=lambda: self._on_edge('L'), trigger=Pin.IRQ_RISING,
+                             bouncetime=self.BOUNCE_TIME)
+            self.touch_R.irq(handler=lambda: self._on_edge('R'), trigger=Pin.IRQ_RISING,
+                             bouncetime=self.BOUNCE_TIME)
+        self._callbacks.append(callback)
+
+    def _on_edge(self, side):
+        now = time.time()
+        other = 'R' if side == 'L' else 'L'
+        # the two pins may call back from different threads
+        with self._edge_lock:
+            # same styles as read(): L after R is a slide 'RS', R after L is 'LS'
+            if self._edge_touch == other and now - self._edge_time <= self.SLIDE_MAX_INTERVAL:
+                val = other + 'S'
+            else:
+                val = side
+            self._edge_touch = side
+            self._edge_time = now
+        for callback in self._callbacks:
+            callback(val, now)
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+import asyncio
+import threading
+from collections import deque, namedtuple
+from time import time
+
+# source: 'touch' or 'sound_direction', value: touch style or angle,
+# timestamp: time() of the edge
+Event = namedtuple('Event', ('source', 'value', 'timestamp'))
+
+
+class EventQueue():
+    """
+    Bounded queue of sensor events, filled from the pin edge callbacks
+
+    Events can be consumed with get() from a thread, with await aget()
+    from asyncio, or received by subscribers as soon as they happen.
+    When the queue is full the oldest event is dropped.
+
+    :param maxsize: max events kept
+    :type maxsize: int
+    """
+
+    def __init__(self, maxsize=64):
+        self._events = deque(maxlen=maxsize)
+        self._condition = threading.Condition()
+        self._waiters = []  # (loop, future) of the pending aget()
+        self._subscribers = []  # (callback, source)
+        self.dropped = 0
+
+    def __len__(self):
+        return len(self._events)
+
+    def put(self, source, value, timestamp=None):
+        '''
+        Add an event, called from the sensor callbacks
+
+        :param source: event source
+        :param value: event value
+        :param timestamp: time() of the event, now if None
+        '''
+        return self.append(Event(source, value, time() if timestamp is None else timestamp))
+
+    def append(self, event):
+        '''
+        Add an already built event, any tuple with a source first
+
+        :return: True if the oldest event was dropped to make room
+        :rtype: bool
+        '''
+        with self._condition:
+            dropped = len(self._events) == self._events.maxlen
+            if dropped:
+                self.dropped += 1
+            self._events.append(event)
+            self._condition.notify()
+            waiters = self._waiters
+            self._waiters = []
+            subscribers = list(self._subscribers)
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(_wake, future)
+        for callback, source in subscribers:
+            if source is None or source == event[0]:
+                callback(event)
+        return dropped
+
+    def subscribe(self, callback, source=None):
+        '''
+        Call a function on every event, from the sensor callback thread,
+        it must return quickly
+
+        :param callback: function taking an Event
+        :param source: only the events of this source, all if None
+        :return: callback, for unsubscribe()
+        '''
+        with self._condition:
+            self._subscribers.append((callback, source))
+        return callback
+
+    def unsubscribe(self, callback):
+        with self._condition:
+            self._subscribers = [s for s in self._subscribers if s[0] is not callback]
+
+    def get(self, timeout=None):
+        '''
+        Oldest event, wait for one if the queue is empty
+
+        :param timeout: max wait, second, forever if None
+        :return: Event, None on timeout
+        '''
+        with self._condition:
+            if not self._condition.wait_for(lambda: len(self._events) > 0, timeout):
+                return None
+            return self._events.popleft()
+
+    async def aget(self):
+        '''
+        Oldest event, awaitable from an asyncio loop
+
+        :return: Event
+        '''
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._condition:
+                if len(self._events) > 0:
+                    return self._events.popleft()
+                future = loop.create_future()
+                self._waiters.append((loop, future))
+            await future
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return await self.aget()
+
+    def clear(self):
+        with self._condition:
+            self._events.clear()
+
+
+def _wake(future):
+    if not future.done():
+        future.set_result(None)
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+import threading
+from collections import deque
+import numpy as np
+from .kinematics import legs_angle_calculation_batch
+
+
+class GaitPlayer():
+    """
+    Legs trajectory looping over a gait cycle, switchable on the fly
+
+    Queue it with Pidog.legs_move_stream(). switch() changes the gait at the
+    nearest compatible phase of the new cycle (same legs raised, closest legs
+    coords) and blends the legs coords over `blend_frames` frames, so that
+    changing direction never stops the legs.
+
+    :param name: gait name
+    :type name: str
+    :param coords: legs coords of the gait cycle, shape (frames, 4, 2)
+    :type coords: array_like
+    :param angles: legs angles of the gait cycle, shape (frames, 8), computed if None
+    :type angles: array_like
+    :param cycles: number of cycles to play after the last switch(), None for endless
+    :type cycles: int
+    :param blend_frames: number of frames to blend the legs coords over when switching
+    :type blend_frames: int
+    """
+
+    BLEND_FRAMES = 4
+    RAISED_THRESHOLD = 1  # mm, a foot higher than the stance height by this is raised
+
+    def __init__(self, name, coords, angles=None, cycles=None, blend_frames=BLEND_FRAMES):
+        self._lock = threading.Lock()
+        self.blend_frames = blend_frames
+        self.finished = False
+        self._pending = None
+        self._blend = deque()
+        self._last_coords = None
+        self._index = 0
+        self._set_gait(name, coords, angles, cycles)
+
+    def __iter__(self):
+        return self
+
+    def _set_gait(self, name, coords, angles, cycles):
+        self.name = name
+        self._coords = np.asarray(coords, dtype=float)
+        if angles is None:
+            angles = legs_angle_calculation_batch(self._coords)
+        self._angles = [tuple(frame) for frame in angles]
+        self._set_cycles(cycles)
+
+    def _set_cycles(self, cycles):
+        self.cycles = cycles
+        self._frames_left = None if cycles is None else cycles * len(self._coords)
+
+    def switch(self, name, coords, angles=None, cycles=None):
+        """
+        Change gait, takes effect on the next frame pulled
+
+        :return: False if the player already finished, queue a new one instead
+        :rtype: bool
+        """
+        with self._lock:
+            if self.finished:
+                return False
+            if name == self.name and self._pending is None:
+                self._set_cycles(cycles)
+            else:
+                self._pending = (name, coords, angles, cycles)
+            return True
+
+    def _nearest_frame(self, current):
+        # frames with the same raised legs as the current coords, then the closest one
+        z = self._coords[..., 1]
+        ground = z.max() - self.RAISED_THRESHOLD
+        raised = z < ground
+        current_raised = current[:, 1] < ground
+        candidates = np.flatnonzero((raised == current_raised).all(axis=1))
+        if len(candidates) == 0:
+            candidates = np.arange(len(self._coords))
+        distances = ((self._coords[candidates] - current)**2).sum(axis=(1, 2))
+        return candidates[np.argmin(distances)]
+
+    def _apply_switch(self):
+        name, coords, angles, cycles = self._pending
+        self._pending = None
+        self._set_gait(name, coords, angles, cycles)
+        self._blend.clear()
+        if self._last_coords is None:
+            self._index = 0
+            return
+
+        frames = len(self._coords)
+        start = self._nearest_frame(self._last_coords)
+        offset = self._last_coords - self._coords[start]
+        count = min(self.blend_frames, frames - 1)
+        if count > 0:
+            indexes = (start + 1 + np.arange(count)) % frames
+            # the offset to the new gait fades out over the blend frames
+            weights = 1 - (np.arange(1, count + 1) / count)
+            blend_coords = self._coords[indexes] + weights[:, None, None] * offset
+            blend_angles = legs_angle_calculation_batch(blend_coords)
+            for i in range(count):
+                self._blend.append((tuple(blend_angles[i]), blend_coords[i]))
+        self._index = (start + 1 + count) % frames
+
+    def __next__(self):
+        with self._lock:
+            if self._pending is not None:
+                self._apply_switch()
+            if self._frames_left == 0:
+                self.finished = True
+                raise StopIteration
+
+            if len(self._blend) > 0:
+                angles, coords = self._blend.popleft()
+            else:
+                angles = self._angles[self._index]
+                coords = self._coords[self._index]
+                self._index = (self._index + 1) % len(self._coords)
+
+            if self._frames_left is not None:
+                self._frames_left -= 1
+            self._last_coords = coords
+            return angles
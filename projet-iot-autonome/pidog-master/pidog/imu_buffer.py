@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+import threading
+from time import time
+import numpy as np
+
+
+class ImuRingBuffer():
+    """
+    Fixed-size history of timestamped IMU samples
+
+    Preallocated arrays written in place by the IMU thread, so that short
+    events between two polls (a tap, the start of a fall) are not missed
+    and detectors can work on whole windows of samples.
+
+    :param capacity: max samples kept, the oldest are overwritten
+    :type capacity: int
+    """
+
+    def __init__(self, capacity=1024):
+        self.capacity = capacity
+        self._t = np.zeros(capacity)
+        self._acc = np.zeros((capacity, 3))
+        self._gyro = np.zeros((capacity, 3))
+        self._head = 0  # next write index
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._size
+
+    def extend(self, timestamps, acc, gyro):
+        '''
+        Append a batch of samples, timestamps must be increasing
+
+        :param timestamps: shape (n,)
+        :param acc: shape (n, 3)
+        :param gyro: shape (n, 3)
+        '''
+        n = len(timestamps)
+        if n == 0:
+            return
+        if n > self.capacity:
+            timestamps = timestamps[-self.capacity:]
+            acc = acc[-self.capacity:]
+            gyro = gyro[-self.capacity:]
+            n = self.capacity
+        with self._lock:
+            first = min(n, self.capacity - self._head)
+            for dst, src in ((self._t, timestamps), (self._acc, acc), (self._gyro, gyro)):
+                dst[self._head:self._head+first] = src[:first]
+                dst[:n-first] = src[first:]
+            self._head = (self._head + n) % self.capacity
+            self._size = min(self._size + n, self.capacity)
+
+    def samples_since(self, since):
+        '''
+        Samples newer than a time
+
+        :param since: time() of the reference, exclusive
+        :type since: float
+        :return: copies of timestamps (n,), acc data (n, 3), gyro data (n, 3), oldest first
+        :rtype: tuple of ndarray
+        '''
+        with self._lock:
+            # the ring holds two sorted segments, the older one starts at head
+            if self._size < self.capacity:
+                segments = ((0, self._size),)
+            else:
+                segments = ((self._head, self.capacity), (0, self._head))
+            parts = []
+            for start, end in segments:
+                i = start + np.searchsorted(self._t[start:end], since, side='right')
+                if i < end:
+                    parts.append(slice(i, end))
+            return tuple(np.concatenate([array[part] for part in parts])
+                         if len(parts) > 0 else np.empty((0,) + array.shape[1:])
+                         for array in (self._t, self._acc, self._gyro))
+
+    def last(self, duration):
+        '''
+        Samples of the last `duration` seconds
+
+        :return: timestamps (n,), acc data (n, 3), gyro data (n, 3), oldest first
+        :rtype: tuple of ndarray
+        '''
+        return self.samples_since(time() - duration)
+
+    def _window(self, duration, sensor):
+        _, acc, gyro = self.last(duration)
+        if sensor == 'acc':
+            return acc
+        elif sensor == 'gyro':
+            return gyro
+        raise ValueError('sensor must be acc or gyro')
+
+    def max_norm(self, duration, sensor='acc'):
+        '''
+        Max vector norm over the last `duration` seconds, e.g. max |a|
+
+        :param sensor: 'acc' or 'gyro'
+        :return: raw units, None if no samples
+        :rtype: float
+        '''
+        data = self._window(duration, sensor)
+        if len(data) == 0:
+            return None
+        return float(np.sqrt((data * data).sum(axis=1)).max())
+
+    def mean(self, duration, sensor='acc'):
+        '''
+        Mean over the last `duration` seconds
+
+        :param sensor: 'acc' or 'gyro'
+        :return: x, y, z mean in raw units, None if no samples
+        :rtype: ndarray
+        '''
+        data = self._window(duration, sensor)
+        if len(data) == 0:
+            return None
+        return data.mean(axis=0)
+
+    def min_max(self, duration, sensor='acc'):
+        '''
+        Per-axis min and max over the last `duration` seconds
+
+        :param sensor: 'acc' or 'gyro'
+        :return: min (3,), max (3,), None if no samples
+        :rtype: tuple of ndarray
+        '''
+        data = self._window(duration, sensor)
+        if len(data) == 0:
+            return None
+        return data.min(axis=0), data.max(axis=0)
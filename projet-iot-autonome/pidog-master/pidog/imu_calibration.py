@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+'''
+IMU offsets from a burst of samples, robot standing still
+
+    the samples moving away from the median (the robot was touched, a servo
+    jerked) are rejected, the axis carrying gravity is detected from the
+    mean, then:
+        acc offset = gravity vector - mean acc
+        gyro offset = - mean gyro
+    the offsets are saved in the config file and reused at startup
+'''
+from collections import namedtuple
+from time import time, sleep
+import numpy as np
+
+# offsets in the units of the samples, gravity axis (0, 1, 2) and sign,
+# samples kept and rejected, standard deviation of the kept samples
+ImuCalibration = namedtuple('ImuCalibration', ('acc_offset', 'gyro_offset', 'gravity_axis',
+                                               'gravity_sign', 'samples', 'rejected',
+                                               'acc_noise', 'gyro_noise'))
+
+OUTLIER_MADS = 3  # samples further from the median than this many MADs are rejected
+MIN_SAMPLES = 10
+GRAVITY_TOLERANCE = 0.15  # max relative error of the measured gravity
+
+# config file keys
+ACC_OFFSET_KEY = 'imu_acc_offset'
+GYRO_OFFSET_KEY = 'imu_gyro_offset'
+GRAVITY_AXIS_KEY = 'imu_gravity_axis'
+
+
+def capture(read, duration=0.5, period=0.1, min_samples=MIN_SAMPLES):
+    '''
+    Record the samples of `duration` seconds, longer if needed to get
+    `min_samples`, up to 4 times `duration`
+
+    :param read: function returning the samples since the last call, timestamps (n,),
+                 acc (n, 3), gyro (n, 3), or False on error, like Pidog._imu_read
+    :param duration: second
+    :param period: time between two reads, shorter than the FIFO fill time,
+                   without FIFO a read returns only the newest sample
+    :param min_samples: samples needed
+    :return: acc (n, 3), gyro (n, 3)
+    :rtype: tuple of ndarray
+    '''
+    # drop what was buffered before
+    read()
+    acc = []
+    gyro = []
+    count = 0
+    start = time()
+    end = start + duration
+    deadline = start + 4 * duration
+    while True:
+        now = time()
+        if now >= deadline or (now >= end and count >= min_samples):
+            break
+        # past `duration`, keep the period until enough samples
+        wait = period if now >= end else min(period, end - now)
+        sleep(min(wait, deadline - now))
+        data = read()
+        if data is False:
+            continue
+        acc.append(data[1])
+        gyro.append(data[2])
+        count += len(data[1])
+    if len(acc) == 0:
+        return np.empty((0, 3)), np.empty((0, 3))
+    return np.concatenate(acc).astype(float), np.concatenate(gyro).astype(float)
+
+
+def inliers(data, mads=OUTLIER_MADS):
+    '''
+    Samples within `mads` MADs of the median on every axis
+
+    :param data: shape (n, 3)
+    :return: boolean mask, shape (n,)
+    :rtype: ndarray
+    '''
+    median = np.median(data, axis=0)
+    deviation = np.abs(data - median)
+    # 1.4826 * MAD estimates the standard deviation, at least 1 LSB
+    sigma = np.maximum(1.4826 * np.median(deviation, axis=0), 1.0)
+    return (deviation <= mads * sigma).all(axis=1)
+
+
+def compute(acc, gyro, lsb_per_g=16384, mads=OUTLIER_MADS):
+    '''
+    Offsets of a still burst of samples
+
+    :param acc: acc data, shape (n, 3)
+    :param gyro: gyro data, shape (n, 3)
+    :param lsb_per_g: acc units per g
+    :param mads: outlier rejection threshold
+    :return: the calibration
+    :rtype: ImuCalibration
+    :raises ValueError: too few samples, or gravity not measured (robot moving)
+    '''
+    acc = np.asarray(acc, dtype=float)
+    gyro = np.asarray(gyro, dtype=float)
+    if len(acc) < MIN_SAMPLES:
+        raise ValueError(f'imu calibration needs {MIN_SAMPLES} samples, got {len(acc)}')
+    keep = inliers(acc, mads) & inliers(gyro, mads)
+    if keep.sum() < MIN_SAMPLES:
+        raise ValueError('imu calibration rejected, the robot is moving')
+    acc_mean = acc[keep].mean(axis=0)
+    gyro_mean = gyro[keep].mean(axis=0)
+
+    axis = int(np.argmax(np.abs(acc_mean)))
+    sign = 1 if acc_mean[axis] > 0 else -1
+    if abs(np.linalg.norm(acc_mean) - lsb_per_g) > GRAVITY_TOLERANCE * lsb_per_g:
+        raise ValueError('imu calibration rejected, gravity not measured')
+    gravity = np.zeros(3)
+    gravity[axis] = sign * lsb_per_g
+
+    return ImuCalibration(acc_offset=np.round(gravity - acc_mean).tolist(),
+                          gyro_offset=np.round(-gyro_mean).tolist(),
+                          gravity_axis=axis,
+                          gravity_sign=sign,
+                          samples=int(keep.sum()),
+                          rejected=int(len(keep) - keep.sum()),
+                          acc_noise=acc[keep].std(axis=0).tolist(),
+                          gyro_noise=gyro[keep].std(axis=0).tolist())
+
+
+def save(db, calibration):
+    '''
+    Store the offsets in a fileDB
+    '''
+    db.set(ACC_OFFSET_KEY, str(list(calibration.acc_offset)))
+    db.set(GYRO_OFFSET_KEY, str(list(calibration.gyro_offset)))
+    db.set(GRAVITY_AXIS_KEY, str(calibration.gravity_sign * (calibration.gravity_axis + 1)))
+
+
+def load(db):
+    '''
+    Offsets stored by save()
+
+    :return: acc offset, gyro offset, gravity axis and sign, None if not stored
+    :rtype: tuple
+    '''
+    acc = db.get(ACC_OFFSET_KEY, None)
+    gyro = db.get(GYRO_OFFSET_KEY, None)
+    gravity = db.get(GRAVITY_AXIS_KEY, None)
+    if acc is None or gyro is None or gravity is None:
+        return None
+    try:
+        acc = [float(i.strip()) for i in acc.strip('[]').split(',')]
+        gyro = [float(i.strip()) for i in gyro.strip('[]').split(',')]
+        gravity = int(gravity)
+    except ValueError:
+        return None
+    if len(acc) != 3 or len(gyro) != 3 or gravity == 0:
+        return None
+    return acc, gyro, abs(gravity) - 1, 1 if gravity > 0 else -1
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+'''
+Gyro + accelerometer fusion of the body attitude
+
+    accelerometer angles, same formulas as the legacy Pidog._imu_thread:
+        pitch = atan(-ay / sqrt(ax^2 + az^2))
+        roll = atan(-az / sqrt(ax^2 + ay^2))
+    the x axis is vertical, so pitch turns around z, roll around y,
+    and yaw around x
+'''
+import numpy as np
+
+# (gyro axis, sign) of the roll, pitch and yaw rates, consistent with the
+# accelerometer formulas above
+GYRO_AXES = ((1, 1), (2, -1), (0, 1))
+
+# max samples filtered at once, bounds alpha**-n in the vectorized recursion
+CHUNK_SIZE = 128
+
+
+def acc_angles(acc):
+    '''
+    Roll and pitch from the accelerometer alone
+
+    :param acc: acc data, shape (n, 3)
+    :type acc: array_like
+    :return: roll, pitch in degrees, each of shape (n,)
+    :rtype: tuple of ndarray
+    '''
+    acc = np.asarray(acc, dtype=float)
+    ax = acc[:, 0]
+    ay = -acc[:, 1]
+    az = -acc[:, 2]
+    pitch = np.degrees(np.arctan(ay / np.sqrt(ax*ax + az*az)))
+    roll = np.degrees(np.arctan(az / np.sqrt(ax*ax + ay*ay)))
+    return roll, pitch
+
+
+def complementary(x0, rates, angles, dt, alpha):
+    '''
+    Vectorized complementary filter of one angle,
+    x[k] = alpha * (x[k-1] + rates[k] * dt) + (1 - alpha) * angles[k]
+
+    :param x0: angle before the first sample
+    :param rates: angular rates, degree/s, shape (n,)
+    :param angles: absolute angles (accelerometer), degree, shape (n,)
+    :param dt: sample period, second
+    :param alpha: gyro weight, 0 to 1
+    :return: filtered angles, shape (n,)
+    :rtype: ndarray
+    '''
+    out = np.empty(len(rates))
+    for start in range(0, len(rates), CHUNK_SIZE):
+        u = alpha * rates[start:start+CHUNK_SIZE] * dt \
+            + (1 - alpha) * angles[start:start+CHUNK_SIZE]
+        powers = alpha ** np.arange(1, len(u) + 1)
+        # x[k] = alpha**k * (x0 + sum(u[j] / alpha**j, j <= k))
+        chunk = powers * (x0 + np.cumsum(u / powers))
+        out[start:start+len(u)] = chunk
+        x0 = chunk[-1]
+    return out
+
+
+class ComplementaryFilter():
+    """
+    Roll, pitch and yaw from batches of gyro + accelerometer samples
+
+    The gyro integration follows fast moves, the accelerometer corrects
+    the drift of roll and pitch with a time constant of `tau` seconds.
+    Yaw has no absolute reference and drifts slowly.
+
+    :param tau: time constant of the accelerometer correction, second
+    :type tau: float
+    :param gyro_sensitivity: gyro LSB per degree/s
+    :type gyro_sensitivity: float
+    :param gyro_axes: (axis, sign) of the roll, pitch and yaw rates in the gyro data
+    :type gyro_axes: tuple
+    """
+
+    def __init__(self, tau=0.5, gyro_sensitivity=16.4, gyro_axes=GYRO_AXES):
+        self.tau = tau
+        self.gyro_sensitivity = gyro_sensitivity
+        self.gyro_axes = gyro_axes
+        self.reset()
+
+    def reset(self):
+        self.roll = 0.0
+        self.pitch = 0.0
+        self.yaw = 0.0
+        self.last_time = None
+
+    def update(self, timestamps, acc, gyro):
+        '''
+        Filter a batch of samples, the state carries over to the next batch
+
+        :param timestamps: sample times, second, shape (n,)
+        :param acc: acc data, shape (n, 3)
+        :param gyro: gyro data, shape (n, 3), offsets applied
+        :return: roll, pitch, yaw of every sample in degrees, shape (n, 3)
+        :rtype: ndarray
+        '''
+        timestamps = np.asarray(timestamps, dtype=float)
+        n = len(timestamps)
+        if n == 0:
+            return np.empty((0, 3))
+        gyro = np.asarray(gyro, dtype=float)
+        acc_roll, acc_pitch = acc_angles(acc)
+
+        if self.last_time is None:
+            # start from the accelerometer attitude
+            self.roll = acc_roll[0]
+            self.pitch = acc_pitch[0]
+            if n > 1:
+                dt = (timestamps[-1] - timestamps[0]) / (n - 1)
+            else:
+                dt = 0.0
+        else:
+            dt = (timestamps[-1] - self.last_time) / n
+        self.last_time = timestamps[-1]
+        dt = max(dt, 0.0)
+        alpha = self.tau / (self.tau + dt) if dt > 0 else 1.0
+
+        rates = [gyro[:, axis] * sign / self.gyro_sensitivity for axis, sign in self.gyro_axes]
+        out = np.empty((n, 3))
+        out[:, 0] = complementary(self.roll, rates[0], acc_roll, dt, alpha)
+        out[:, 1] = complementary(self.pitch, rates[1], acc_pitch, dt, alpha)
+        out[:, 2] = self.yaw + np.cumsum(rates[2] * dt)
+        out[:, 2] = (out[:, 2] + 180) % 360 - 180
+
+        self.roll, self.pitch, self.yaw = out[-1].tolist()
+        return out
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+'''
+Batch inverse kinematics of the legs
+
+    coords of a leg: [y, z], the foot position relative to the shoulder
+    angles of a leg: [leg_angle, foot_angle]
+
+    legs order: left front, right front, left hind, right hind
+'''
+import numpy as np
+from math import cos, sin, sqrt, acos, atan2, degrees
+
+# structure constants, same as Pidog.LEG, Pidog.FOOT
+LEG = 42
+FOOT = 76
+
+# The left and right sides are opposite
+LEGS_SIGNS = np.array([1, -1, 1, -1], dtype=float)
+
+
+def coord2polar_batch(coords, leg=LEG, foot=FOOT, pitch=0.0):
+    '''
+    Vectorized coord2polar
+
+    :param coords: [y, z] coords, shape (..., 2)
+    :type coords: array_like
+    :param leg: length of the upper leg
+    :param foot: length of the foot
+    :param pitch: body pitch added to the leg angle, radian
+    :return: alpha, beta in degrees, each of shape (...)
+    :rtype: tuple of ndarray
+    '''
+    coords = np.asarray(coords, dtype=float)
+    y = coords[..., 0]
+    z = coords[..., 1]
+    u2 = y*y + z*z
+    u = np.sqrt(u2)
+
+    cos_angle1 = (foot**2 + leg**2 - u2) / (2 * foot * leg)
+    beta = np.arccos(np.clip(cos_angle1, -1, 1))
+
+    angle1 = np.arctan2(y, z)
+    cos_angle2 = (leg**2 + u2 - foot**2) / (2 * leg * u)
+    angle2 = np.arccos(np.clip(cos_angle2, -1, 1))
+    alpha = angle2 + angle1 + pitch
+
+    return np.degrees(alpha), np.degrees(beta)
+
+
+def legs_angle_calculation_batch(coords, leg=LEG, foot=FOOT, pitch=0.0):
+    '''
+    Vectorized Pidog.legs_angle_calculation
+
+    :param coords: legs coords, shape (N, 4, 2), or (4, 2) for a single frame
+    :type coords: array_like
+    :param leg: length of the upper leg
+    :param foot: length of the foot
+    :param pitch: body pitch added to the legs angles, radian
+    :return: servo angles, shape (N, 8), or (8,) for a single frame
+    :rtype: ndarray
+    '''
+    coords = np.asarray(coords, dtype=float)
+    alpha, beta = coord2polar_batch(coords, leg, foot, pitch)
+    angles = np.empty(coords.shape[:-1] + (2,))
+    np.multiply(alpha, LEGS_SIGNS, out=angles[..., 0])
+    np.multiply(beta - 90, LEGS_SIGNS, out=angles[..., 1])
+    return angles.reshape(coords.shape[:-2] + (8,))
+
+
+def legs_angle_calculation_single(coords, leg=LEG, foot=FOOT, pitch=0.0):
+    '''
+    legs_angle_calculation_batch of one frame with plain floats, for the
+    per-call path (pose2legs_angle), where the NumPy temporaries of the
+    batch version cost more than the math itself
+
+    :param coords: legs coords, shape (4, 2)
+    :type coords: array_like
+    :param leg: length of the upper leg
+    :param foot: length of the foot
+    :param pitch: body pitch added to the legs angles, radian
+    :return: servo angles, 8 floats
+    :rtype: list
+    '''
+    angles = []
+    for i, (y, z) in enumerate(coords):
+        u2 = y*y + z*z
+        u = sqrt(u2)
+        cos_angle1 = (foot**2 + leg**2 - u2) / (2 * foot * leg)
+        beta = acos(min(max(cos_angle1, -1.0), 1.0))
+        cos_angle2 = (leg**2 + u2 - foot**2) / (2 * leg * u)
+        alpha = acos(min(max(cos_angle2, -1.0), 1.0)) + atan2(y, z) + pitch
+        # The left and right sides are opposite
+        sign = 1.0 if i % 2 == 0 else -1.0
+        angles += [sign * degrees(alpha), sign * (degrees(beta) - 90)]
+    return angles
+
+
+def body_rotation(roll, pitch, yaw, out=None):
+    '''
+    Body rotation matrix, rotx * roty(-pitch) * rotz fused into one matrix
+
+    :param roll: radian
+    :param pitch: radian
+    :param yaw: radian
+    :param out: preallocated (3, 3) array to write into
+    :return: rotation matrix, shape (3, 3)
+    :rtype: ndarray
+    '''
+    if out is None:
+        out = np.empty((3, 3))
+    cr, sr = cos(roll), sin(roll)
+    cp, sp = cos(pitch), sin(pitch)
+    cy, sy = cos(yaw), sin(yaw)
+    out[0, 0] = cr*cy + sr*sp*sy
+    out[0, 1] = -cr*sy + sr*sp*cy
+    out[0, 2] = -sr*cp
+    out[1, 0] = cp*sy
+    out[1, 1] = cp*cy
+    out[1, 2] = sp
+    out[2, 0] = sr*cy - cr*sp*sy
+    out[2, 1] = -sr*sy - cr*sp*cy
+    out[2, 2] = cr*cp
+    return out
+
+
+def pose2body_points(pose, rpy, body_struct, rot=None, out=None):
+    '''
+    Shoulders positions in the field frame, pose + rot * body_struct
+
+    :param pose: body position, shape (3, 1)
+    :param rpy: roll, pitch, yaw, radian
+    :param body_struct: shoulders positions in the body frame, shape (3, 4)
+    :param rot: preallocated (3, 3) work buffer
+    :param out: preallocated (3, 4) array to write into
+    :return: shape (3, 4)
+    :rtype: ndarray
+    '''
+    rot = body_rotation(rpy[0], rpy[1], rpy[2], out=rot)
+    out = np.matmul(rot, body_struct, out=out)
+    out += pose
+    return out
+
+
+def pose2legs_coords(body_points, leg_points, out=None):
+    '''
+    Legs [y, z] coords relative to the shoulders
+
+    :param body_points: shoulders positions, shape (3, 4)
+    :param leg_points: feet positions, shape (3, 4)
+    :param out: preallocated (4, 2) array to write into
+    :return: shape (4, 2)
+    :rtype: ndarray
+    '''
+    if out is None:
+        out = np.empty((4, 2))
+    np.subtract(leg_points[1], body_points[1], out=out[:, 0])
+    np.subtract(body_points[2], leg_points[2], out=out[:, 1])
+    return out
@@ -1,16 +1,31 @@
 #!/usr/bin/env python3
 import os
 import sys
+import pwd
 from time import sleep, time
-from multiprocessing import Process, Value, Lock
 import threading
+import itertools
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 from math import pi, sin, cos, sqrt, acos, atan2, atan
-from robot_hat import Robot, Pin, Ultrasonic, utils, Music, I2C
+from robot_hat import Robot, utils, Music, I2C
 from .sh3001 import Sh3001
 from .rgb_strip import RGBStrip
 from .sound_direction import SoundDirection
 from .dual_touch import DualTouch
+from .action_buffer import ActionBuffer
+from .unified_controller import UnifiedController, ServoTrack
+from .gait_player import GaitPlayer
+from .robot_state import PidogState
+from .imu_fusion import ComplementaryFilter
+from .imu_buffer import ImuRingBuffer
+from . import imu_calibration
+from .ultrasonic_reader import UltrasonicReader
+from .events import EventQueue
+from .sensor_hub import SensorHub, ImuSample, DistanceSample
+from .battery_monitor import BatteryMonitor
+from .kinematics import (legs_angle_calculation_batch, legs_angle_calculation_single,
+                         pose2body_points, pose2legs_coords)
 import warnings
 warnings.filterwarnings("ignore") # ignore warnings for pygame # not work
 
@@ -38,10 +53,13 @@ warnings.filterwarnings("ignore") # ignore warnings for pygame # not work
 
 '''
 
-# user and User home directory
+# user and User home directory, no subprocess at import
 is_run_with_root = (os.geteuid() == 0)
-User = os.popen('echo ${SUDO_USER:-$LOGNAME}').readline().strip()
-UserHome = os.popen('getent passwd %s | cut -d: -f 6' %User).readline().strip()
+User = os.environ.get('SUDO_USER') or os.environ.get('LOGNAME') or ''
+try:
+    UserHome = pwd.getpwnam(User).pw_dir
+except KeyError:
+    UserHome = os.path.expanduser('~')
 config_file = '%s/.config/pidog/pidog.conf' % UserHome
 
 # color:
@@ -56,8 +74,12 @@ PURPLE = '0;35'
 DARK_GREEN = '0;36'
 WHITE = '0;37'
 
+# the init threads print concurrently
+_print_lock = threading.Lock()
+
 def print_color(msg, end='\n', file=sys.stdout, flush=False, color=''):
-    print('\033[%sm%s\033[0m'%(color, msg), end=end, file=file, flush=flush)
+    with _print_lock:
+        print('\033[%sm%s\033[0m'%(color, msg), end=end, file=file, flush=flush)
 
 def info(msg, end='\n', file=sys.stdout, flush=False):
     print_color(msg, end=end, file=file, flush=flush, color=WHITE)
@@ -72,18 +94,6 @@ def error(msg, end='\n', file=sys.stdout, flush=False):
     print_color(msg, end=end, file=file, flush=flush, color=RED)
 
 
-def compare_version(original_version, object_version):
-    or_v = tuple(int(val) for val in original_version.split('.'))
-    ob_v = tuple(int(val) for val in object_version.split('.'))
-    return (or_v >= or_v)
-    
-if compare_version(np.__version__, '2.0.0'):
-    def numpy_mat(data):
-        return np.asmatrix(data)
-else:
-    def numpy_mat(data):
-        return numpy_mat(data)
-
 class Pidog():
 
     # structure constants
@@ -91,7 +101,7 @@ class Pidog():
     FOOT = 76
     BODY_LENGTH = 117
     BODY_WIDTH = 98
-    BODY_STRUCT = numpy_mat([
+    BODY_STRUCT = np.array([
         [-BODY_WIDTH / 2, -BODY_LENGTH / 2,  0],
         [BODY_WIDTH / 2, -BODY_LENGTH / 2,  0],
         [-BODY_WIDTH / 2,  BODY_LENGTH / 2,  0],
@@ -123,28 +133,118 @@ class Pidog():
     HEAD_PITCH_MIN = -45
     HEAD_PITCH_MAX = 30
 
+    # unified controller tick period, second
+    CONTROL_PERIOD = 0.02
+
+    # IMU samples kept in imu_buffer, about 4 s at the 250 Hz FIFO rate
+    IMU_BUFFER_SIZE = 1024
+    # sensor hub reads per second
+    SENSOR_RATES = {'imu': 20, 'distance': 20, 'battery': 1}
+
+    # accData and gyroData units whatever the IMU ranges: LSB of the 2g and 2000 degree/s ranges
+    IMU_ACC_LSB = 16384  # per g
+    IMU_GYRO_LSB = 16.4  # per degree/s
+    IMU_MAX_POLL_RATE = 100  # IMU reads per second
+    IMU_CALIBRATION_DURATION = 0.5  # second
+    # sound directions ignored until the servos have been still for this long, second
+    SERVO_NOISE_SETTLE = 0.3
+    DISTANCE_MAX_AGE = 1.0  # second, read_distance() returns -1 for older readings
+    # imu_configure() profiles, poll_rate None adapts it to the sample rate
+    IMU_PROFILES = {
+        # 100 Hz attitude for balance control: 1 kHz ODR, FIFO at 500 Hz averaged by 5
+        'balance': {'odr': Sh3001.SH3001_ODR_1000HZ,
+                    'acc_range': Sh3001.SH3001_ACC_RANGE_4G,
+                    'gyro_range': Sh3001.SH3001_GYRO_RANGE_1000,
+                    'acc_cutoff': Sh3001.SH3001_ACC_ODRX040,
+                    'gyro_cutoff': Sh3001.SH3001_GYRO_ODRX00,
+                    'fifo_freq': Sh3001.SH3001_FIFO_FREQ_X1_2,
+                    'decimation': 5,
+                    'poll_rate': None},
+        # startup configuration
+        'default': {'odr': Sh3001.SH3001_ODR_500HZ,
+                    'acc_range': Sh3001.SH3001_ACC_RANGE_2G,
+                    'gyro_range': Sh3001.SH3001_GYRO_RANGE_2000,
+                    'acc_cutoff': Sh3001.SH3001_ACC_ODRX025,
+                    'gyro_cutoff': Sh3001.SH3001_GYRO_ODRX00,
+                    'fifo_freq': Sh3001.SH3001_FIFO_FREQ_X1_2,
+                    'decimation': 1,
+                    'poll_rate': 20},
+        # idle power saving: 62.5 Hz ODR, FIFO at 15.6 Hz, read twice per second
+        'idle': {'odr': Sh3001.SH3001_ODR_63HZ,
+                 'acc_range': Sh3001.SH3001_ACC_RANGE_2G,
+                 'gyro_range': Sh3001.SH3001_GYRO_RANGE_2000,
+                 'acc_cutoff': Sh3001.SH3001_ACC_ODRX011,
+                 'gyro_cutoff': Sh3001.SH3001_GYRO_ODRX00,
+                 'fifo_freq': Sh3001.SH3001_FIFO_FREQ_X1_4,
+                 'decimation': 1,
+                 'poll_rate': 2},
+    }
+
     # init
     def __init__(self, leg_pins=DEFAULT_LEGS_PINS, head_pins=DEFAULT_HEAD_PINS, tail_pin=DEFAULT_TAIL_PIN,
-                 leg_init_angles=None, head_init_angles=None, tail_init_angle=None):
-
-
+                 leg_init_angles=None, head_init_angles=None, tail_init_angle=None,
+                 unified_control=False, lazy=False):
+        '''
+        :param unified_control: drive legs, head and tail from one fixed-rate
+                                control loop instead of one thread per part
+        :type unified_control: bool
+        :param lazy: bring the sensors, rgb strip and sound up on first use
+                     instead of at startup, the servos are always initialized
+        :type lazy: bool
+        '''
+        startup_start = time()
+        self.startup_report = {'total': 0.0, 'lazy': lazy, 'subsystems': {}}
+        self._lazy_lock = threading.RLock()
+        self._lazy_pending = set()
+
+        start = time()
         utils.reset_mcu()
-        sleep(0.2)
+        self._report_subsystem('mcu_reset', 'ok', time() - start)
+        mcu_ready = start + 0.2
+
+        self.thread_list = []
+        self.exit_flag = False
+        self.events = None
+        self._event_sources = set()
+        self._last_servo_move = 0.0
+        self._servos_moving = 0  # servo_move() calls in progress, see _servo_move_start()
+        # all the sensor reads on one schedule, started with the action threads
+        self.sensor_hub = SensorHub()
+        # smoothed voltage and power limits
+        self.battery = BatteryMonitor()
+        self.battery.add_callback(self._on_power_level)
+        self.sensor_hub.add_sensor('battery', self._battery_step, self.SENSOR_RATES['battery'])
+
+        # the other peripherals do not depend on the MCU, bring them up while it boots
+        if lazy:
+            self._lazy_pending.update(self.SUBSYSTEMS)
+            for name in self.SUBSYSTEMS:
+                self._report_subsystem(name, 'lazy', 0.0)
+            futures = []
+        else:
+            pool = ThreadPoolExecutor(max_workers=len(self.POOL_SUBSYSTEMS),
+                                      thread_name_prefix='pidog_init')
+            futures = [pool.submit(self._init_subsystem, name) for name in self.POOL_SUBSYSTEMS]
+            pool.shutdown(wait=False)
 
         from .actions_dictionary import ActionDict
         self.actions_dict = ActionDict()
 
         self.body_height = 80
-        self.pose = numpy_mat([0.0,  0.0,  self.body_height]).T  # target position vector
+        self.pose = np.array([[0.0,  0.0,  self.body_height]]).T  # target position vector
         self.rpy = np.array([0.0,  0.0,  0.0]) * pi / 180  # Euler angle, converted to radian value
-        self.leg_point_struc = numpy_mat([
+        self.leg_point_struc = np.array([
             [-self.BODY_WIDTH / 2, -self.BODY_LENGTH / 2,  0],
             [self.BODY_WIDTH / 2, -self.BODY_LENGTH / 2,  0],
             [-self.BODY_WIDTH / 2,  self.BODY_LENGTH / 2,  0],
             [self.BODY_WIDTH / 2,  self.BODY_LENGTH / 2,  0]
         ]).T
-        self.pitch = 0
-        self.roll = 0
+        # feet positions, set by set_legs()
+        self.legpoint_struc = self.BODY_STRUCT.copy()
+        # pose2legs_angle work buffers
+        self._rot_buf = np.empty((3, 3))
+        self._body_points_buf = np.empty((3, 4))
+        self._legs_coords_buf = np.empty((4, 2))
 
         self.roll_last_error = 0
         self.roll_error_integral = 0
@@ -162,11 +262,18 @@ class Pidog():
         if tail_init_angle == None:
             tail_init_angle = [0]
 
-        self.thread_list = []
+        self.unified_control = unified_control
+        self.controller = None
+        self.gait_player = None
+        self.gait_lock = threading.Lock()
 
+        remaining = mcu_ready - time()
+        if remaining > 0:
+            sleep(remaining)
+
+        start = time()
         try:
             debug(f"config_file: {config_file}")
-            debug("robot_hat init ... ", end='', flush=True)
             self.legs = Robot(pin_list=leg_pins, name='legs', init_angles=leg_init_angles, init_order=[
                             0, 2, 4, 6, 1, 3, 5, 7], db=config_file)
             self.head = Robot(pin_list=head_pins, name='head',
@@ -180,13 +287,9 @@ class Pidog():
             self.head.max_dps = self.HEAD_DPS
             self.tail.max_dps = self.TAIL_DPS
 
-            self.legs_action_buffer = []
-            self.head_action_buffer = []
-            self.tail_action_buffer = []
-
-            self.legs_thread_lock = threading.Lock()
-            self.head_thread_lock = threading.Lock()
-            self.tail_thread_lock = threading.Lock()
+            self.legs_action_buffer = ActionBuffer()
+            self.head_action_buffer = ActionBuffer()
+            self.tail_action_buffer = ActionBuffer()
 
             self.legs_actions_coords_buffer = []
 
@@ -199,75 +302,259 @@ class Pidog():
             self.tail_speed = 90
 
             # done
-            debug("done")
+            self._report_subsystem('robot_hat', 'ok', time() - start)
         except OSError:
-            error("fail")
+            self._report_subsystem('robot_hat', 'fail', time() - start)
             raise OSError("rotbot_hat I2C init failed. Please try again.")
 
-        try:
-            debug("imu_sh3001 init ... ", end='', flush=True)
-            self.imu = Sh3001(db=config_file)
-            self.imu_acc_offset = [0, 0, 0]
-            self.imu_gyro_offset = [0, 0, 0]
-            self.accData = [0, 0, 0]  # ax,ay,az
-            self.gyroData = [0, 0, 0]  # gx,gy,gz
-            self.imu_fail_count = 0
-            # add imu thread
-            self.thread_list.append("imu")
-            debug("done")
-        except OSError:
-            error("fail")
-
-        try:
-            debug("rgb_strip init ... ", end='', flush=True)
-            self.rgb_thread_run = True
-            self.rgb_strip = RGBStrip(addr=0X74, nums=11)
-            self.rgb_strip.set_mode('breath', 'black')
-            self.rgb_fail_count = 0
-            # add rgb thread
-            self.thread_list.append("rgb")
-            debug("done")
-        except OSError:
-            error("fail")
-
-        try:
-            debug("dual_touch init ... ", end='', flush=True)
-            self.dual_touch = DualTouch('D2', 'D3')
-            self.touch = 'N'
-            debug("done")
-        except:
-            error("fail")
-
-        try:
-            debug("sound_direction init ... ", end='', flush=True)
-            self.ears = SoundDirection()
-            # self.sound_direction = -1
-            debug("done")
-        except:
-            error("fail")
+        # re-raise the unexpected init errors
+        for future in futures:
+            future.result()
+
+        # state snapshot, replaced by the control threads, see get_state()
+        self._state_lock = threading.Lock()
+        self._state = PidogState(
+            version=0, timestamp=time(),
+            legs_angles=tuple(self.leg_current_angles),
+            head_angles=tuple(self.head_current_angles),
+            tail_angles=tuple(self.tail_current_angles),
+            legs_depth=0, head_depth=0, tail_depth=0,
+            legs_done=True, head_done=True, tail_done=True,
+            pitch=0.0, roll=0.0, yaw=0.0, acc=(0, 0, 0), gyro=(0, 0, 0), imu_time=0.0,
+            distance=-1.0, distance_time=0.0,
+            battery_voltage=None, battery_trend=0.0, battery_level='normal')
 
+        self.action_threads_start()
+        if not lazy:
+            # forked once the init threads are done
+            self._init_subsystem('ultrasonic')
+        self.startup_report['total'] = time() - startup_start
+
+    # subsystems initialized concurrently at startup, or on first use with lazy=True
+    # name: (init method, attributes bringing it up on first use, init errors tolerated),
+    # the init method may return a dict of details added to its startup_report entry
+    SUBSYSTEMS = {
+        'imu_sh3001': ('_imu_init', ('imu', 'accData', 'gyroData', 'imu_acc_offset',
+                       'imu_gyro_offset', 'imu_fail_count', 'imu_lock', 'imu_poll_rate',
+                       'imu_calibration', 'imu_last_batch', 'imu_filter', 'imu_buffer',
+                       'pitch', 'roll', 'yaw'), (OSError,)),
+        'rgb_strip': ('_rgb_strip_init', ('rgb_strip', 'rgb_fail_count', 'rgb_thread_run'), (OSError,)),
+        'dual_touch': ('_dual_touch_init', ('dual_touch', 'touch'), (Exception,)),
+        'sound_direction': ('_sound_direction_init', ('ears',), (Exception,)),
+        'sound_effect': ('_sound_effect_init', ('music',), (Exception,)),
+        'ultrasonic': ('_ultrasonic_init', ('ultrasonic_reader',), ()),
+    }
+    # the ultrasonic process is forked from the main thread, not from the pool
+    POOL_SUBSYSTEMS = ('imu_sh3001', 'rgb_strip', 'dual_touch', 'sound_direction', 'sound_effect')
+    LAZY_ATTRIBUTES = {attr: name for name, (_, attrs, _) in SUBSYSTEMS.items() for attr in attrs}
+
+    def __getattr__(self, name):
+        # only called for missing attributes: bring a lazy subsystem up on first use
+        subsystem = self.LAZY_ATTRIBUTES.get(name)
+        pending = self.__dict__.get('_lazy_pending')
+        if subsystem is None or pending is None:
+            raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+        with self._lazy_lock:
+            if subsystem in pending:
+                pending.discard(subsystem)
+                self._init_subsystem(subsystem)
+                if not self.exit_flag:
+                    self._subsystem_threads_start(subsystem)
+        # still missing if the init failed
+        return object.__getattribute__(self, name)
+
+    def _report_subsystem(self, name, status, duration, details=None):
+        entry = {'status': status, 'duration': duration}
+        entry.update(details or {})
+        self.startup_report['subsystems'][name] = entry
+        if status == 'fail':
+            error(f"{name} init ... fail ({duration*1000:.0f} ms)")
+        elif status == 'ok':
+            debug(f"{name} init ... done ({duration*1000:.0f} ms)")
+
+    def _init_subsystem(self, name):
+        init, _, tolerated = self.SUBSYSTEMS[name]
+        start = time()
         try:
-            debug("sound_effect init ... ", end='', flush=True)
-            self.music = Music()
-            debug("done")
-        except:
-            error("fail")
-
-        self.distance = Value('f', -1.0)
-
-        self.sensory_process = None
-        self.sensory_lock = Lock()
+            details = getattr(self, init)()
+        except tolerated:
+            self._report_subsystem(name, 'fail', time() - start)
+        except BaseException:
+            self._report_subsystem(name, 'fail', time() - start)
+            raise
+        else:
+            self._report_subsystem(name, 'ok', time() - start, details)
 
-        self.exit_flag = False
-        self.action_threads_start()
+    def _imu_init(self):
+        self.pitch = 0
+        self.roll = 0
+        self.yaw = 0
+        self.imu_acc_offset = [0, 0, 0]
+        self.imu_gyro_offset = [0, 0, 0]
+        self.accData = [0, 0, 0]  # ax,ay,az
+        self.gyroData = [0, 0, 0]  # gx,gy,gz
+        self.imu_fail_count = 0
+        self.imu_last_batch = None
+        # timestamped samples history, offsets applied
+        self.imu_buffer = ImuRingBuffer(self.IMU_BUFFER_SIZE)
+        self.imu = Sh3001(db=config_file)
+        # gyro + accelerometer attitude, at the IMU sample rate
+        self.imu_filter = ComplementaryFilter(gyro_sensitivity=self.IMU_GYRO_LSB)
+        self.imu_lock = threading.Lock()
+        self.imu_poll_rate = self.SENSOR_RATES['imu']
+        # last imu_calibrate() result
+        self.imu_calibration = None
+        # add imu thread
+        self.thread_list.append("imu")
+
+    def _rgb_strip_init(self):
+        self.rgb_thread_run = True
+        self.rgb_fail_count = 0
+        self.rgb_strip = RGBStrip(addr=0X74, nums=11)
+        self.rgb_strip.set_max_brightness(self.battery.limits()['brightness'])
+        self.rgb_strip.set_mode('breath', 'black')
+        # add rgb thread
+        self.thread_list.append("rgb")
+        return {'i2c_writes': self.rgb_strip.init_writes, 'i2c_time': self.rgb_strip.init_time}
+
+    def _dual_touch_init(self):
+        self.touch = 'N'
+        self.dual_touch = DualTouch('D2', 'D3')
+
+    def _sound_direction_init(self):
+        self.ears = SoundDirection()
+        # self.sound_direction = -1
+
+    def _sound_effect_init(self):
+        self.music = Music()
+
+    def _ultrasonic_init(self):
+        self.ultrasonic_reader = UltrasonicReader(trig='D1', echo='D0', timeout=0.017)
         self.sensory_process_start()
+        self._last_distance_time = None
+        self.sensor_hub.add_sensor('distance', self._distance_step, self.SENSOR_RATES['distance'])
+
+    def _distance_step(self):
+        # run by the sensor hub, publishes the new echoes only
+        distance, distance_time = self.ultrasonic_reader.read()
+        if distance is None or distance_time == self._last_distance_time:
+            return None
+        self._last_distance_time = distance_time
+        distance = round(distance, 2)
+        self._publish_state(distance=distance, distance_time=distance_time)
+        return DistanceSample(distance, distance_time)
+
+    def read_distance(self, max_age=None):
+        '''
+        Filtered ultrasonic distance
+
+        :param max_age: if set, also return the age of the reading, and None
+                        instead of a reading older than max_age seconds
+        :type max_age: float
+        :return: distance in cm, -1 if no echo or no reading for DISTANCE_MAX_AGE,
+                 or (distance, age) with max_age
+        '''
+        distance, distance_time = self.ultrasonic_reader.read()
+        if max_age is None:
+            if distance is None or time() - distance_time > self.DISTANCE_MAX_AGE:
+                return -1.0
+            return round(distance, 2)
+        if distance is None:
+            return None, float('inf')
+        age = time() - distance_time
+        if age > max_age:
+            return None, age
+        return round(distance, 2), age
+
+    def ultrasonic_stats(self):
+        '''
+        Counters of the ultrasonic process, see UltrasonicReader.stats()
+        '''
+        return self.ultrasonic_reader.stats()
+
+    def enable_events(self, touch=True, sound_direction=True, maxsize=64):
+        '''
+        Edge-triggered touch and sound direction events, pushed to
+        self.events instead of polling dual_touch.read() and ears.isdetected()
+
+        :param touch: 'touch' events, the value is the touch style
+        :param sound_direction: 'sound_direction' events, the value is the angle,
+                                ears.isdetected() polling no longer sees them
+        :param maxsize: max events kept, the oldest are dropped
+        :return: the event queue, also self.events
+        :rtype: EventQueue
+        '''
+        if self.events is None:
+            self.events = EventQueue(maxsize)
+        sources = []
+        if touch:
+            sources.append(('touch', 'dual_touch'))
+        if sound_direction:
+            sources.append(('sound_direction', 'ears'))
+        for source, attr in sources:
+            if source in self._event_sources:
+                continue
+            try:
+                sensor = getattr(self, attr)
+            except AttributeError:
+                warn(f'{source} events unavailable, {attr} init failed')
+                continue
+            sensor.add_callback(lambda value, timestamp, source=source:
+                                self._on_sensor_event(source, value, timestamp))
+            self._event_sources.add(source)
+        return self.events
+
+    def start_sound_tracking(self, half_life=2.0):
+        '''
+        Track the sound directions in the background, the readings taken
+        while the servos move are ignored, see sound_bearing()
+
+        :param half_life: how fast old directions fade, second
+        '''
+        self.ears.start_tracking(half_life, is_quiet=self._servos_quiet)
+
+    def sound_bearing(self):
+        '''
+        Stable direction of the sounds heard, needs start_sound_tracking()
+
+        :return: bearing in degree (0 to 360) and confidence (0 to 1), None, 0 if nothing heard
+        :rtype: tuple
+        '''
+        return self.ears.bearing()
+
+    def _servos_quiet(self):
+        return self._servos_moving == 0 and time() - self._last_servo_move > self.SERVO_NOISE_SETTLE
+
+    def _servo_move_start(self, current, frame):
+        # the servos are noisy from the start of the move, return whether they turn,
+        # then _servo_move_end() when servo_move() returns
+        if list(frame) == list(current):
+            return False
+        with self._state_lock:
+            self._servos_moving += 1
+            self._last_servo_move = time()
+        return True
+
+    def _servo_move_end(self):
+        with self._state_lock:
+            self._servos_moving -= 1
+            self._last_servo_move = time()
 
-    def read_distance(self):
-        return round(self.distance.value, 2)
+    def _on_sensor_event(self, source, value, timestamp):
+        self.events.put(source, value, timestamp)
+        self.sensor_hub.publish(source, value, timestamp)
 
     # action related: legs,head,tail,imu,rgb_strip
     def close_all_thread(self):
         self.exit_flag = True
+        self.sensor_hub.stop()
+        if self.controller is not None:
+            self.controller.stop()
+        # wake up the action threads blocked on empty buffers, and keep the ones
+        # about to block from waiting
+        self.legs_action_buffer.close()
+        self.head_action_buffer.close()
+        self.tail_action_buffer.close()
 
     def close(self):
         import signal
@@ -295,18 +582,22 @@ class Pidog():
             self.stop_and_lie()
             self.close_all_thread()
 
-            self.legs_thread.join()
-            self.head_thread.join()
-            self.tail_thread.join()
+            if self.unified_control:
+                self.controller.join()
+            else:
+                self.legs_thread.join()
+                self.head_thread.join()
+                self.tail_thread.join()
 
             if 'rgb' in self.thread_list:
                 self.rgb_thread_run = False
+                self.rgb_strip.wake()
                 self.rgb_strip_thread.join()
                 self.rgb_strip.close()
             if 'imu' in self.thread_list:
                 self.imu_thread.join()
-            if self.sensory_process != None:
-                self.sensory_process.terminate()
+            if 'ultrasonic_reader' in self.__dict__:
+                self.ultrasonic_reader.stop()
 
             info('Quit')
         except Exception as e:
@@ -348,77 +639,170 @@ class Pidog():
     def action_threads_start(self):
         # Immutable objects int, float, string, tuple, etc., need to be declared with global
         # Variable object lists, dicts, instances of custom classes, etc., do not need to be declared with global
-        if 'legs' in self.thread_list:
+        self.legs_action_buffer.reopen()
+        self.head_action_buffer.reopen()
+        self.tail_action_buffer.reopen()
+        if self.unified_control and 'legs' in self.thread_list:
+            self._control_start()
+        elif 'legs' in self.thread_list:
             self.legs_thread = threading.Thread(name='legs_thread', target=self._legs_action_thread)
             self.legs_thread.daemon = True
             self.legs_thread.start()
-        if 'head' in self.thread_list:
+        if 'head' in self.thread_list and not self.unified_control:
             self.head_thread = threading.Thread(name='head_thread', target=self._head_action_thread)
             self.head_thread.daemon = True
             self.head_thread.start()
-        if 'tail' in self.thread_list:
+        if 'tail' in self.thread_list and not self.unified_control:
             self.tail_thread = threading.Thread(name='tail_thread', target=self._tail_action_thread)
             self.tail_thread.daemon = True
             self.tail_thread.start()
-        if 'rgb' in self.thread_list:
+        self.sensor_hub.start()
+        self._subsystem_threads_start('rgb_strip')
+        self._subsystem_threads_start('imu_sh3001')
+
+    def _subsystem_threads_start(self, name):
+        if name == 'rgb_strip' and 'rgb' in self.thread_list:
             self.rgb_strip_thread = threading.Thread(name='rgb_strip_thread', target=self._rgb_strip_thread)
             self.rgb_strip_thread.daemon = True
             self.rgb_strip_thread.start()
-        if 'imu' in self.thread_list:
+        elif name == 'imu_sh3001' and 'imu' in self.thread_list:
             self.imu_thread = threading.Thread(name='imu_thread', target=self._imu_thread)
             self.imu_thread.daemon = True
             self.imu_thread.start()
 
+    # unified control: legs, head and tail in one loop
+    def _control_start(self):
+        if self.controller is None:
+            def on_legs_frame(angles):
+                self.leg_current_angles = angles
+                return angles
+
+            def on_head_frame(angles):
+                self.head_current_angles = angles
+                return self._head_servo_angles(angles)
+
+            def on_tail_frame(angles):
+                self.tail_current_angles = angles
+                return angles
+
+            self.controller = UnifiedController([
+                ServoTrack('legs', self.legs, self.legs_action_buffer,
+                           self._limited_legs_speed, on_frame=on_legs_frame),
+                ServoTrack('head', self.head, self.head_action_buffer,
+                           lambda: self.head_speed, on_frame=on_head_frame, done_on_pop=True),
+                ServoTrack('tail', self.tail, self.tail_action_buffer,
+                           lambda: self.tail_speed, on_frame=on_tail_frame, done_on_pop=True),
+            ], period=self.CONTROL_PERIOD, on_tick=self._publish_controller_state)
+        self.controller.start()
+
+    def get_state(self):
+        '''
+        Latest robot state snapshot, O(1) and without locking
+
+        :return: immutable snapshot, replaced (never modified) by the control
+                 threads after every tick, compare `version` to detect updates
+        :rtype: PidogState
+        '''
+        return self._state
+
+    def _publish_state(self, **changes):
+        # writers are serialized, readers just take the current reference
+        with self._state_lock:
+            state = self._state
+            changes['version'] = state.version + 1
+            changes['timestamp'] = time()
+            changes['legs_depth'] = len(self.legs_action_buffer)
+            changes['head_depth'] = len(self.head_action_buffer)
+            changes['tail_depth'] = len(self.tail_action_buffer)
+            changes['legs_done'] = self.legs_action_buffer.is_done()
+            changes['head_done'] = self.head_action_buffer.is_done()
+            changes['tail_done'] = self.tail_action_buffer.is_done()
+            # the servos make noise when they turn, not when a frame repeats the angles
+            for name in ('legs_angles', 'head_angles', 'tail_angles'):
+                if name in changes and changes[name] != getattr(state, name):
+                    self._last_servo_move = changes['timestamp']
+                    break
+            self._state = state._replace(**changes)
+
+    def get_control_stats(self):
+        '''
+        Tick timing statistics of the unified controller, None in per-part threads mode
+        '''
+        if self.controller is None:
+            return None
+        return self.controller.stats()
+
+    def _publish_controller_state(self):
+        self._publish_state(legs_angles=tuple(self.leg_current_angles),
+                            head_angles=tuple(self.head_current_angles),
+                            tail_angles=tuple(self.tail_current_angles))
+
+    def _head_servo_angles(self, angles):
+        _angles = list.copy(angles)
+        _angles[0] = self.limit(self.HEAD_YAW_MIN, self.HEAD_YAW_MAX, _angles[0])
+        _angles[1] = self.limit(self.HEAD_ROLL_MIN, self.HEAD_ROLL_MAX, _angles[1])
+        _angles[2] = self.limit(self.HEAD_PITCH_MIN, self.HEAD_PITCH_MAX, _angles[2])
+        _angles[2] += self.HEAD_PITCH_OFFSET
+        return _angles
+
     # legs
     def _legs_action_thread(self):
         while not self.exit_flag:
+            # block until a frame is queued
+            frame = self.legs_action_buffer.get()
+            if frame is None:
+                continue
+            moving = self._servo_move_start(self.leg_current_angles, frame)
             try:
-                with self.legs_thread_lock:
-                    self.leg_current_angles = list.copy(self.legs_action_buffer[0])
-                # Release lock after copying data before the next operations
-                self.legs.servo_move(self.leg_current_angles, self.legs_speed)
-                with self.legs_thread_lock:
-                    self.legs_action_buffer.pop(0)
-            except IndexError:
-                sleep(0.001)
+                self.leg_current_angles = list(frame)
+                self.legs.servo_move(self.leg_current_angles, self._limited_legs_speed())
             except Exception as e:
                 error(f'\r_legs_action_thread Exception:{e}')
                 break
+            finally:
+                if moving:
+                    self._servo_move_end()
+                self.legs_action_buffer.task_done()
+            self._publish_state(legs_angles=tuple(frame))
 
     # head
     def _head_action_thread(self):
         while not self.exit_flag:
+            frame = self.head_action_buffer.get()
+            if frame is None:
+                continue
+            self.head_action_buffer.task_done()
+            moving = self._servo_move_start(self.head_current_angles, frame)
             try:
-                with self.head_thread_lock:
-                    self.head_current_angles = list.copy(self.head_action_buffer[0])
-                    self.head_action_buffer.pop(0)
-                # Release lock after copying data before the next operations
-                _angles = list.copy(self.head_current_angles)
-                _angles[0] = self.limit(self.HEAD_YAW_MIN, self.HEAD_YAW_MAX, _angles[0])
-                _angles[1] = self.limit(self.HEAD_ROLL_MIN, self.HEAD_ROLL_MAX, _angles[1])
-                _angles[2] = self.limit(self.HEAD_PITCH_MIN, self.HEAD_PITCH_MAX, _angles[2])
-                _angles[2] += self.HEAD_PITCH_OFFSET
+                self.head_current_angles = list(frame)
+                _angles = self._head_servo_angles(self.head_current_angles)
                 self.head.servo_move(_angles, self.head_speed)
-            except IndexError:
-                sleep(0.001)
+                self._publish_state(head_angles=tuple(frame))
             except Exception as e:
                 error(f'\r_head_action_thread Exception:{e}')
                 break
+            finally:
+                if moving:
+                    self._servo_move_end()
 
     # tail
     def _tail_action_thread(self):
         while not self.exit_flag:
+            frame = self.tail_action_buffer.get()
+            if frame is None:
+                continue
+            self.tail_action_buffer.task_done()
+            moving = self._servo_move_start(self.tail_current_angles, frame)
             try:
-                with self.tail_thread_lock:
-                    self.tail_current_angles = list.copy(self.tail_action_buffer[0])
-                    self.tail_action_buffer.pop(0)
-                # Release lock after copying data before the next operations
+                self.tail_current_angles = list(frame)
                 self.tail.servo_move(self.tail_current_angles, self.tail_speed)
-            except IndexError:
-                sleep(0.001)
+                self._publish_state(tail_angles=tuple(frame))
             except Exception as e:
                 error(f'\r_tail_action_thread Exception:{e}')
                 break
+            finally:
+                if moving:
+                    self._servo_move_end()
 
     # rgb strip
     def _rgb_strip_thread(self):
@@ -435,84 +819,193 @@ class Pidog():
 
     # IMU
 
-    def _imu_thread(self):
-        # imu calibrate
-        _ax = 0
-        _ay = 0
-        _az = 0
-        _gx = 0
-        _gy = 0
-        _gz = 0
-        time = 10
-        for _ in range(time):
+    def _imu_read(self):
+        # samples since the last read: timestamps (n,), acc data (n, 3), gyro data (n, 3),
+        # drained from the FIFO in bulk if enabled, or False on error,
+        # in IMU_ACC_LSB and IMU_GYRO_LSB units
+        if self.imu.fifo_enabled:
+            data = self.imu.read_fifo()
+        else:
             data = self.imu._sh3001_getimudata()
-            if data == False:
-                break
-
-            self.accData, self.gyroData = data
-            _ax += self.accData[0]
-            _ay += self.accData[1]
-            _az += self.accData[2]
-            _gx += self.gyroData[0]
-            _gy += self.gyroData[1]
-            _gz += self.gyroData[2]
-            sleep(0.1)
+            if data != False:
+                acc, gyro = data
+                data = np.array([time()]), np.array([acc]), np.array([gyro])
+        if data is False:
+            return False
+        timestamps, acc, gyro = data
+        acc_scale = self.IMU_ACC_LSB / self.imu.acc_sensitivity
+        gyro_scale = self.IMU_GYRO_LSB / self.imu.gyro_sensitivity
+        if acc_scale != 1:
+            acc = acc * acc_scale
+        if gyro_scale != 1:
+            gyro = gyro * gyro_scale
+        return timestamps, acc, gyro
 
-        self.imu_acc_offset[0] = round(-16384 - _ax/time, 0)
-        self.imu_acc_offset[1] = round(0 - _ay/time, 0)
-        self.imu_acc_offset[2] = round(0 - _az/time, 0)
-        self.imu_gyro_offset[0] = round(0 - _gx/time, 0)
-        self.imu_gyro_offset[1] = round(0 - _gy/time, 0)
-        self.imu_gyro_offset[2] = round(0 - _gz/time, 0)
+    def _imu_thread(self):
+        # calibrate, then the sensor hub reads the IMU
+        if not self.imu.fifo_start(self.imu.fifo_freq):
+            warn('\r_imu_thread FIFO unavailable, reading single samples')
+        self._imu_calibrate()
+        if not self.exit_flag:
+            self.sensor_hub.add_sensor('imu', self._imu_step, self.imu_poll_rate,
+                                       on_disable=self._on_imu_disabled)
+
+    def imu_configure(self, profile=None, odr=None, acc_range=None, gyro_range=None,
+                      acc_cutoff=None, gyro_cutoff=None, fifo_freq=None, decimation=None,
+                      poll_rate=None):
+        '''
+        Change the IMU configuration at runtime, the arguments override the
+        profile, None keeps the current value
+
+        :param profile: 'balance', 'default' or 'idle', see IMU_PROFILES
+        :param odr: Sh3001.SH3001_ODR_*
+        :param acc_range: Sh3001.SH3001_ACC_RANGE_*
+        :param gyro_range: Sh3001.SH3001_GYRO_RANGE_*
+        :param acc_cutoff: Sh3001.SH3001_ACC_ODRX*
+        :param gyro_cutoff: Sh3001.SH3001_GYRO_ODRX*
+        :param fifo_freq: Sh3001.SH3001_FIFO_FREQ_X1_*
+        :param decimation: FIFO samples averaged into one
+        :param poll_rate: IMU reads per second, if None adapted to the new
+                          sample rate when odr, fifo_freq or decimation change
+        :return: IMU reads per second
+        :rtype: float
+        '''
+        params = {}
+        if profile is not None:
+            params.update(self.IMU_PROFILES[profile])
+        for name, value in (('odr', odr), ('acc_range', acc_range), ('gyro_range', gyro_range),
+                            ('acc_cutoff', acc_cutoff), ('gyro_cutoff', gyro_cutoff),
+                            ('fifo_freq', fifo_freq), ('decimation', decimation),
+                            ('poll_rate', poll_rate)):
+            if value is not None:
+                params[name] = value
+
+        with self.imu_lock:
+            if params.get('fifo_freq') is not None:
+                self.imu.fifo_freq = params['fifo_freq']
+            if params.get('decimation') is not None:
+                self.imu.set_decimation(params['decimation'])
+            # restarts the FIFO at the new rate
+            self.imu.configure(odr=params.get('odr'),
+                               acc_range=params.get('acc_range'),
+                               gyro_range=params.get('gyro_range'),
+                               acc_cutoff=params.get('acc_cutoff'),
+                               gyro_cutoff=params.get('gyro_cutoff'))
+            if params.get('poll_rate') is not None:
+                self.imu_poll_rate = params['poll_rate']
+            elif any(params.get(name) is not None for name in ('odr', 'fifo_freq', 'decimation')):
+                self.imu_poll_rate = self._imu_adapted_poll_rate()
+        try:
+            self.sensor_hub.set_rate('imu', self.imu_poll_rate)
+        except KeyError:
+            # still calibrating, registered at this rate afterwards
+            pass
+        return self.imu_poll_rate
+
+    def _imu_adapted_poll_rate(self):
+        # one read per sample up to IMU_MAX_POLL_RATE,
+        # and often enough to drain the FIFO before it is half full
+        rate = min(self.imu.sample_rate, self.IMU_MAX_POLL_RATE)
+        if self.imu.fifo_enabled:
+            frames = self.imu.FIFO_SIZE // self.imu.FIFO_FRAME_SIZE
+            rate = max(rate, self.imu.fifo_rate / (frames / 2))
+        return rate
+
+    def _imu_calibrate(self):
+        # offsets stored in the config file, or a burst of samples on the first startup
+        stored = imu_calibration.load(self.imu.db)
+        if stored is not None:
+            self.imu_acc_offset = list(stored[0])
+            self.imu_gyro_offset = list(stored[1])
+            return
+        try:
+            self.imu_calibrate()
+        except ValueError as e:
+            warn(f'\r{e}, imu offsets not set')
+
+    def imu_calibrate(self, duration=IMU_CALIBRATION_DURATION, save=True):
+        '''
+        Measure the IMU offsets, the robot must stand still
+
+        :param duration: samples recorded, second
+        :param save: store the offsets in the config file, reused at startup
+        :return: the calibration, see imu_calibration.compute()
+        :rtype: ImuCalibration
+        :raises ValueError: the robot moved during the measure
+        '''
+        # pause the sensor hub reads, they would drain the samples
+        paused = 'imu' in self.sensor_hub.stats()
+        if paused:
+            self.sensor_hub.set_rate('imu', 0)
+
+        def read():
+            with self.imu_lock:
+                return self._imu_read()
 
-        while not self.exit_flag:
-            try:
-                data = self.imu._sh3001_getimudata()
-                if data == False:
-                    self.imu_fail_count += 1
-                    if self.imu_fail_count > 10:
-                        error('\r_imu_thread imu data error')
-                        break
-                self.accData, self.gyroData = data
-                self.accData[0] += self.imu_acc_offset[0]
-                self.accData[1] += self.imu_acc_offset[1]
-                self.accData[2] += self.imu_acc_offset[2]
-                self.gyroData[0] += self.imu_gyro_offset[0]
-                self.gyroData[1] += self.imu_gyro_offset[1]
-                self.gyroData[2] += self.imu_gyro_offset[2]
-                ax = self.accData[0]
-                ay = self.accData[1]
-                az = self.accData[2]
-                ay = -ay
-                az = -az
-
-                self.pitch = atan(ay/sqrt(ax*ax+az*az))*57.2957795
-                self.roll = atan(az/sqrt(ax*ax+ay*ay))*57.2957795
-
-                self.imu_fail_count = 0
-                sleep(0.05)
-            except Exception as e:
-                self.imu_fail_count += 1
-                sleep(0.001)
-                if self.imu_fail_count > 10:
-                    error(f'\r_imu_thread Exception:{e}')
-                    self.exit_flag = True
-                    break
+        try:
+            # without FIFO every read returns one sample, read faster
+            period = 0.1 if self.imu.fifo_enabled else 0.02
+            acc, gyro = imu_calibration.capture(read, duration, period)
+        finally:
+            if paused:
+                self.sensor_hub.set_rate('imu', self.imu_poll_rate)
+        calibration = imu_calibration.compute(acc, gyro, lsb_per_g=self.IMU_ACC_LSB)
+        self.imu_acc_offset = list(calibration.acc_offset)
+        self.imu_gyro_offset = list(calibration.gyro_offset)
+        self.imu_calibration = calibration
+        if save:
+            imu_calibration.save(self.imu.db, calibration)
+        return calibration
+
+    def _on_imu_disabled(self, name, e):
+        # same as the former imu thread: no attitude, no motion
+        error(f'\r_imu_thread Exception:{e}, stopping the threads')
+        self.close_all_thread()
+
+    def _imu_step(self):
+        # one IMU update, run by the sensor hub:
+        # drain the samples, filter them, publish the attitude
+        with self.imu_lock:
+            data = self._imu_read()
+        if data is False:
+            self.imu_fail_count += 1
+            raise OSError('imu data error')
+        timestamps, acc, gyro = data
+        if len(timestamps) == 0:
+            # FIFO not filled yet
+            return None
+        acc = acc + self.imu_acc_offset
+        gyro = gyro + self.imu_gyro_offset
+        # every sample of the batch, offsets applied
+        self.imu_last_batch = (timestamps, acc, gyro)
+        self.imu_buffer.extend(timestamps, acc, gyro)
+
+        self.accData = acc[-1].tolist()
+        self.gyroData = gyro[-1].tolist()
+
+        # every sample of the batch goes through the filter
+        self.imu_filter.update(timestamps, acc, gyro)
+        self.roll = self.imu_filter.roll
+        self.pitch = self.imu_filter.pitch
+        self.yaw = self.imu_filter.yaw
+        self._publish_state(pitch=self.pitch, roll=self.roll, yaw=self.yaw,
+                            acc=tuple(self.accData), gyro=tuple(self.gyroData),
+                            imu_time=float(timestamps[-1]))
+        self.imu_fail_count = 0
+        return ImuSample(self.roll, self.pitch, self.yaw,
+                         tuple(self.accData), tuple(self.gyroData), len(timestamps))
 
     # clear actions buff
     def legs_stop(self):
-        with self.legs_thread_lock:
-            self.legs_action_buffer.clear()
+        self.legs_action_buffer.clear()
         self.wait_legs_done()
 
     def head_stop(self):
-        with self.head_thread_lock:
-            self.head_action_buffer.clear()
+        self.head_action_buffer.clear()
         self.wait_head_done()
 
     def tail_stop(self):
-        with self.tail_thread_lock:
-            self.tail_action_buffer.clear()
+        self.tail_action_buffer.clear()
         self.wait_tail_done()
 
     def body_stop(self):
@@ -525,9 +1018,75 @@ class Pidog():
         if immediately == True:
             self.legs_stop()
         self.legs_speed = speed
-        with self.legs_thread_lock:
-            self.legs_action_buffer += target_angles
+        self.legs_action_buffer.extend(target_angles)
         
+    def legs_move_stream(self, source, immediately=True, speed=50):
+        '''
+        Move legs along a trajectory pulled lazily by the legs thread
+
+        :param source: iterable of 8-angles frames, may be endless (e.g. itertools.cycle),
+                       legs_stop() cancels it within one frame
+        :type source: iterable
+        '''
+        if immediately == True:
+            self.legs_stop()
+        self.legs_speed = speed
+        self.legs_action_buffer.extend_stream(source)
+
+    def move_gait(self, name, speed=50, cycles=None):
+        '''
+        Walk with a gait of actions_dict.GAITS, without blocking
+
+        If a gait is already playing, switch to the new one at the nearest
+        compatible phase of its cycle and blend into it, instead of stopping.
+
+        :param name: 'forward', 'backward', 'turn_left', 'turn_right' or 'trot'
+        :type name: str
+        :param cycles: gait cycles to play after this call, None to walk until legs_stop()
+        :type cycles: int
+        '''
+        coords = self.actions_dict.compiled_gait_coords(name)
+        angles = self.actions_dict.compiled_gait(name)
+        self._play_gait(name, coords, angles, speed, cycles)
+
+    def walk_velocity(self, vx, yaw_rate, speed=50, cycles=None):
+        '''
+        Walk along a curve given by a velocity vector, without blocking
+
+        The left and right legs step widths follow vx and yaw_rate, so that
+        an analog joystick steers smoothly, a zero vector stops the legs.
+
+        :param vx: forward speed, -1 to 1, negative is backward
+        :type vx: float
+        :param yaw_rate: turning speed, -1 to 1, positive turns left
+        :type yaw_rate: float
+        :param cycles: gait cycles to play after this call, None to walk until legs_stop()
+        :type cycles: int
+        '''
+        gait = self.actions_dict.velocity_gait(vx, yaw_rate)
+        if gait is None:
+            # drop the queued frames, the current one still completes
+            self.legs_action_buffer.clear()
+            return
+        name, coords, angles = gait
+        self._play_gait(name, coords, angles, speed, cycles)
+
+    def _play_gait(self, name, coords, angles, speed, cycles):
+        with self.gait_lock:
+            self.legs_speed = speed
+            player = self.gait_player
+            if player is not None and self.legs_action_buffer.has_stream(player) \
+                    and player.switch(name, coords, angles, cycles):
+                return
+            self.gait_player = GaitPlayer(name, coords, angles, cycles=cycles)
+            # drop queued frames without waiting, the current one still completes
+            self.legs_action_buffer.clear()
+            self.legs_move_stream(self.gait_player, immediately=False, speed=speed)
+
+    def is_gait_running(self):
+        player = self.gait_player
+        return player is not None and self.legs_action_buffer.has_stream(player)
+
     def head_rpy_to_angle(self, target_yrp, roll_comp=0, pitch_comp=0):
         yaw, roll, pitch = target_yrp
         signed = -1 if yaw < 0 else 1
@@ -545,64 +1104,44 @@ class Pidog():
         angles = [self.head_rpy_to_angle(
             target_yrp, roll_comp, pitch_comp) for target_yrp in target_yrps]
 
-        with self.head_thread_lock:
-            self.head_action_buffer += angles
+        self.head_action_buffer.extend(angles)
+
+    def head_move_stream(self, source, roll_comp=0, pitch_comp=0, immediately=True, speed=50):
+        if immediately == True:
+            self.head_stop()
+        self.head_speed = speed
+        angles = (self.head_rpy_to_angle(target_yrp, roll_comp, pitch_comp) for target_yrp in source)
+        self.head_action_buffer.extend_stream(angles)
 
     def head_move_raw(self, target_angles, immediately=True, speed=50):
         if immediately == True:
             self.head_stop()
         self.head_speed = speed
-        with self.head_thread_lock:
-            self.head_action_buffer += target_angles
+        self.head_action_buffer.extend(target_angles)
 
     def tail_move(self, target_angles, immediately=True, speed=50):
         if immediately == True:
             self.tail_stop()
         self.tail_speed = speed
-        with self.tail_thread_lock:
-            self.tail_action_buffer += target_angles
+        self.tail_action_buffer.extend(target_angles)
         
-    # ultrasonic
-    def _ultrasonic_thread(self, distance_addr, lock):
-        while True:
-            try:
-                with lock:
-                    val = round(float(self.ultrasonic.read()), 2)
-                    distance_addr.value = val
-                sleep(0.01)
-            except Exception as e:
-                sleep(0.1)
-                error(f'\rultrasonic_thread  except: {e}')
-                break
+    def tail_move_stream(self, source, immediately=True, speed=50):
+        if immediately == True:
+            self.tail_stop()
+        self.tail_speed = speed
+        self.tail_action_buffer.extend_stream(source)
 
     # sensory_process : ultrasonic
-    def sensory_process_work(self, distance_addr, lock):
-        try:
-            debug("ultrasonic init ... ", end='', flush=True)
-            echo = Pin('D0')
-            trig = Pin('D1')
-            self.ultrasonic = Ultrasonic(trig, echo, timeout=0.017)
-            # add ultrasonic thread
-            self.thread_list.append("ultrasonic")
-            debug("done")
-        except Exception as e:
-            error("fail")
-            raise ValueError(e)
-
-        if 'ultrasonic' in self.thread_list:
-            ultrasonic_thread = threading.Thread(name='ultrasonic_thread',
-                                             target=self._ultrasonic_thread,
-                                             args=(distance_addr, lock,))
-            # ultrasonic_thread.daemon = True
-            ultrasonic_thread.start()
+    @property
+    def sensory_process(self):
+        reader = self.__dict__.get('ultrasonic_reader')
+        return None if reader is None else reader.process
 
     def sensory_process_start(self):
-        if self.sensory_process != None:
-            self.sensory_process.terminate()
-        self.sensory_process = Process(name='sensory_process',
-                                         target=self.sensory_process_work,
-                                         args=(self.distance, self.sensory_lock))
-        self.sensory_process.start()
+        '''
+        Start or restart the ultrasonic process
+        '''
+        self.ultrasonic_reader.start()
 
     # reset: stop, stop_and_lie
     def stop_and_lie(self, speed=85):
@@ -729,79 +1268,27 @@ class Pidog():
             self.rpy[2] = yaw / 180. * pi
 
     def set_legs(self, legs_list):
-        self.legpoint_struc = numpy_mat([
-            [-self.BODY_WIDTH / 2, -self.BODY_LENGTH / 2 +
-                legs_list[0][0], self.body_height - legs_list[0][1]],
-            [self.BODY_WIDTH / 2, -self.BODY_LENGTH / 2 +
-                legs_list[1][0], self.body_height - legs_list[1][1]],
-            [-self.BODY_WIDTH / 2,  self.BODY_LENGTH / 2 +
-                legs_list[2][0], self.body_height - legs_list[2][1]],
-            [self.BODY_WIDTH / 2,  self.BODY_LENGTH / 2 +
-                legs_list[3][0], self.body_height - legs_list[3][1]]
-        ]).T
-
-    # pose and Euler Angle algorithm
-    def pose2coords(self):
-        roll = self.rpy[0]
-        pitch = self.rpy[1]
-        yaw = self.rpy[2]
-
-        rotx = numpy_mat([
-            [cos(roll), 0, -sin(roll)],
-            [0, 1,           0],
-            [sin(roll), 0,  cos(roll)]])
-        roty = numpy_mat([
-            [1,         0,          0],
-            [0, cos(-pitch), -sin(-pitch)],
-            [0, sin(-pitch),  cos(-pitch)]])
-        rotz = numpy_mat([
-            [cos(yaw), -sin(yaw), 0],
-            [sin(yaw),  cos(yaw), 0],
-            [0,         0, 1]])
-        rot_mat = rotx * roty * rotz
-        AB = numpy_mat(np.zeros((3, 4)))
+        # fill the preallocated feet positions in place
+        struc = self.legpoint_struc
+        struc[0, :] = self.BODY_STRUCT[0, :]
         for i in range(4):
-            AB[:, i] = - self.pose - rot_mat * \
-                self.BODY_STRUCT[:, i] + self.legpoint_struc[:, i]
+            struc[1, i] = self.BODY_STRUCT[1, i] + legs_list[i][0]
+            struc[2, i] = self.body_height - legs_list[i][1]
 
-        body_coor_list = []
-        for i in range(4):
-            body_coor_list.append([(self.legpoint_struc - AB).T[i, 0],
-                                  (self.legpoint_struc - AB).T[i, 1], (self.legpoint_struc - AB).T[i, 2]])
-
-        leg_coor_list = []
-        for i in range(4):
-            leg_coor_list.append(
-                [self.legpoint_struc.T[i, 0], self.legpoint_struc.T[i, 1], self.legpoint_struc.T[i, 2]])
+    # pose and Euler Angle algorithm
+    def _pose2body_points(self):
+        return pose2body_points(self.pose, self.rpy, self.BODY_STRUCT,
+                                rot=self._rot_buf, out=self._body_points_buf)
 
-        return {"leg": leg_coor_list, "body": body_coor_list}
+    def pose2coords(self):
+        body_points = self._pose2body_points()
+        return {"leg": self.legpoint_struc.T.tolist(), "body": body_points.T.tolist()}
 
     def pose2legs_angle(self):
-        data = self.pose2coords()
-        leg_coor_list = data["leg"]
-        body_coor_list = data["body"]
-        coords = []
-        angles = []
-
-        for i in range(4):
-            coords.append([
-                leg_coor_list[i][1] - body_coor_list[i][1],
-                body_coor_list[i][2] - leg_coor_list[i][2]])
-
-        angles = []
-
-        for i, coord in enumerate(coords):
-
-            leg_angle, foot_angle = self.fieldcoord2polar(coord)
-            # The left and right sides are opposite
-            leg_angle = leg_angle
-            foot_angle = foot_angle-90
-            if i % 2 != 0:
-                leg_angle = -leg_angle
-                foot_angle = -foot_angle
-            angles += [leg_angle, foot_angle]
-
-        return angles
+        body_points = self._pose2body_points()
+        coords = pose2legs_coords(body_points, self.legpoint_struc, out=self._legs_coords_buf)
+        # one frame, plain floats are faster than the batch IK here
+        return legs_angle_calculation_single(coords.tolist(), self.LEG, self.FOOT, pitch=self.rpy[1])
 
     # Pose calculated coord is Field coord, acoord refer to field, not refer to robot
     def fieldcoord2polar(self, coord):
@@ -872,6 +1359,18 @@ class Pidog():
 
         return translate_list
 
+    @classmethod
+    def legs_angle_calculation_batch(cls, coords):
+        """
+        Vectorized legs_angle_calculation
+
+        :param coords: legs coords of N frames, shape (N, 4, 2)
+        :type coords: array_like
+        :return: legs angles of N frames, shape (N, 8)
+        :rtype: numpy.ndarray
+        """
+        return legs_angle_calculation_batch(coords, cls.LEG, cls.FOOT)
+
     # limit
     def limit(self, min, max, x):
         if x > max:
@@ -907,51 +1406,121 @@ class Pidog():
         self.servo_move(translate_list, speed)
 
     # do action
+    @staticmethod
+    def _repeat_frames(frames, step_count):
+        if step_count is None:
+            return itertools.cycle(frames)
+        return itertools.chain.from_iterable(itertools.repeat(frames, step_count))
+
     def do_action(self, action_name, step_count=1, speed=50, pitch_comp=0):
+        '''
+        Queue a preset action from actions_dict
+
+        :param step_count: times to repeat the action, None to repeat until
+                           stopped (legs_stop/head_stop/tail_stop/body_stop)
+        :type step_count: int or None
+        '''
         try:
             actions, part = self.actions_dict[action_name]
+            frames = self._repeat_frames(actions, step_count)
             if part == 'legs':
-                for _ in range(step_count):
-                    self.legs_move(actions, immediately=False, speed=speed)
+                self.legs_move_stream(frames, immediately=False, speed=speed)
             elif part == 'head':
-                for _ in range(step_count):
-                    self.head_move(actions, pitch_comp=pitch_comp, immediately=False, speed=speed)
+                self.head_move_stream(frames, pitch_comp=pitch_comp, immediately=False, speed=speed)
             elif part == 'tail':
-                for _ in range(step_count):
-                    self.tail_move(actions, immediately=False, speed=speed)
+                self.tail_move_stream(frames, immediately=False, speed=speed)
         except KeyError:
             error("do_action: No such action")
         except Exception as e:
             error(f"do_action:{e}")
 
-    def wait_legs_done(self):
-        while not self.is_legs_done():
-            sleep(0.001)
+    def wait_legs_done(self, timeout=None):
+        return self.legs_action_buffer.wait_done(timeout)
 
-    def wait_head_done(self):
-        while not self.is_head_done():
-            sleep(0.001)
+    def wait_head_done(self, timeout=None):
+        return self.head_action_buffer.wait_done(timeout)
 
-    def wait_tail_done(self):
-        while not self.is_tail_done():
-            sleep(0.001)
+    def wait_tail_done(self, timeout=None):
+        return self.tail_action_buffer.wait_done(timeout)
 
-    def wait_all_done(self):
-        self.wait_legs_done()
-        self.wait_head_done()
-        self.wait_tail_done()
+    def wait_all_done(self, timeout=None):
+        """
+        Block until legs, head and tail buffers are all drained
+
+        :param timeout: max seconds to wait in total, None for no limit
+        :type timeout: float
+        :return: True if all drained, False if timed out
+        :rtype: bool
+        """
+        if timeout is None:
+            return self.wait_legs_done() and self.wait_head_done() and self.wait_tail_done()
+        deadline = time() + timeout
+        for wait in (self.wait_legs_done, self.wait_head_done, self.wait_tail_done):
+            if not wait(max(0, deadline - time())):
+                return False
+        return True
 
     def is_legs_done(self):
-        return not bool(len(self.legs_action_buffer) > 0)
+        return self.legs_action_buffer.is_done()
 
     def is_head_done(self):
-        return not bool(len(self.head_action_buffer) > 0)
+        return self.head_action_buffer.is_done()
 
     def is_tail_done(self):
-        return not bool(len(self.tail_action_buffer) > 0)
+        return self.tail_action_buffer.is_done()
 
     def is_all_done(self):
         return self.is_legs_done() and self.is_head_done() and self.is_tail_done()
 
-    def get_battery_voltage(self):
+    def get_battery_voltage(self, fresh=False):
+        '''
+        Battery voltage, smoothed by the battery monitor
+
+        :param fresh: read the ADC instead of the monitor value
+        :return: V
+        :rtype: float
+        '''
+        if not fresh and self.battery.voltage is not None:
+            return round(self.battery.voltage, 2)
         return round( utils.get_battery_voltage(), 2)
+
+    def _battery_step(self):
+        # run by the sensor hub
+        sample = self.battery.update(round(utils.get_battery_voltage(), 2), time())
+        self._publish_state(battery_voltage=round(sample.voltage, 2),
+                            battery_trend=round(sample.trend, 3), battery_level=sample.level)
+        return sample
+
+    def power_limits(self):
+        '''
+        Limits of the battery level, see BatteryMonitor.POWER_LIMITS
+
+        :return: max legs speed, max rgb brightness, autonomous duty
+        :rtype: dict
+        '''
+        return self.battery.limits()
+
+    def _limited_legs_speed(self):
+        return min(self.legs_speed, self.battery.limits()['legs_speed'])
+
+    def _on_power_level(self, old_level, level):
+        limits = self.battery.limits()
+        warn(f'\rbattery {level}: {self.battery.voltage:.2f} V, legs speed <= {limits["legs_speed"]}, '
+             f'brightness <= {limits["brightness"]}')
+        # not through __getattr__, a lazy rgb strip gets the limit at init
+        if 'rgb_strip' in self.__dict__:
+            self.rgb_strip.set_max_brightness(limits['brightness'])
+
+    def autonomous_rest(self, active_time):
+        '''
+        Rest to take after `active_time` seconds of autonomous activity,
+        to keep the duty of the battery level
+
+        :param active_time: second
+        :return: rest time in second, None if the autonomous activity must stop
+        :rtype: float
+        '''
+        duty = self.battery.limits()['duty']
+        if duty <= 0:
+            return None
+        return active_time * (1 / duty - 1)
@@ -1,9 +1,49 @@
 #!/usr/bin/env python3
 import time
+import threading
+import itertools
+from collections import OrderedDict
 from smbus import SMBus
 import numpy as np
 import math
 
+
+class Layer():
+    """
+    An animation stacked over the base mode of the strip, see RGBStrip.add_layer()
+
+    :param name: layer name
+    :type name: str
+    :param style: rgb display style
+    :type style: str
+    :param color: [r, g, b]
+    :type color: list
+    :param bps: beats per second
+    :type bps: float or int
+    :param brightness: rgb display brightness
+    :type brightness: float or int
+    :param alpha: opacity over what is below, 0 to 1
+    :type alpha: float
+    :param start: time.monotonic() of the first frame
+    :type start: float
+    :param duration: second, forever if None
+    :type duration: float
+    """
+
+    def __init__(self, name, style, color, bps, brightness, alpha, start, duration=None):
+        self.name = name
+        self.style = style
+        self.color = color
+        self.bps = bps
+        self.brightness = brightness
+        self.alpha = alpha
+        self.start = start
+        self.end = None if duration is None else start + duration
+        # rendered by RGBStrip.show()
+        self.frames = None
+        self.holds = None
+
+
 class RGBStrip():
     # preset colors define
     COLORS = {
@@ -29,6 +69,8 @@ class RGBStrip():
     ]
 
     MIN_DELAY = 0.05
+    FRAME_CACHE_SIZE = 8  # rendered modes kept
+    BLOCK_SIZE = 32  # max data bytes of an smbus block write
 
     # region constants
     CONFIGURE_CMD_PAGE = 0XFD
@@ -110,11 +152,34 @@ class RGBStrip():
         self.current_frame = 0
         self.bps = 1.5 # beats per second
         self.is_changed = False
+        self.max_brightness = 1.0  # cap of brightness, power saving
+        # rendered frames of the last modes, see _render()
+        self._frame_cache = OrderedDict()
+        self.frame_cache_hits = 0
+        self.frame_cache_misses = 0
+        self._holds = []  # frames each frame stays the same, see _holds_of()
+        self._render_brightness = 1.0  # brightness of the frames being rendered
+        # timeline, the frame shown is the one due at time.monotonic(),
+        # counted from _origin for the base mode, from their start for the layers
+        self._origin = time.monotonic()
+        self._layers = []  # Layer, bottom first, replaced on change
+        self._layer_ids = itertools.count()
+        # wakes show() up on mode change
+        self._changed = threading.Condition()
+        self._woken = False
+        # what the chip holds: selected page and the r, g, b register rows
+        # last written by display(), None if unknown
+        self._display_lock = threading.Lock()
+        self._page = None
+        self._rows = [None, None, None]
+        self.writes_saved = 0  # bus writes skipped as the data was already there
+        self.bus_writes = 0  # i2c transactions
 
         # Initial
         # =================================================================
         self.bus = SMBus(1)
         self.addr = addr
+        init_start = time.time()
 
         # Setting SLED1735 Ram Page to Function Page
         self.write_cmd(self.CONFIGURE_CMD_PAGE, self.FUNCTION_PAGE)
@@ -153,22 +218,34 @@ class RGBStrip():
         # Clear LED CTL Registers (Frame1Page)
         self.write_Ndata(0X00, 0XFF, 0X10)
         self.write_Ndata(0x20, 0x00, 0X80)
+        # for the startup report
+        self.init_time = time.time() - init_start
+        self.init_writes = self.bus_writes
 
     # i2c communicate
     # =================================================================
     def write_cmd(self, reg, cmd):
         self.bus.write_byte_data(self.addr, reg, cmd)
+        self.bus_writes += 1
+        if reg == self.CONFIGURE_CMD_PAGE:
+            self._page = cmd
 
     def write_Ndata(self, startaddr, data, length):
-        addr = startaddr
+        """
+        Write consecutive registers, in block writes of BLOCK_SIZE bytes
+
+        :param startaddr: first register
+        :param data: value of all the registers, or list of values
+        :type data: int or list
+        :param length: number of registers
+        """
         if isinstance(data, int):
-            for i in range(length):
-                self.write_cmd(addr, data)
-                addr += 1
-        elif isinstance(data, list):
-            for i in range(length):
-                self.write_cmd(addr, data[i])
-                addr += 1
+            data = [data] * length
+        else:
+            data = list(data[:length])
+        for i in range(0, length, self.BLOCK_SIZE):
+            self.bus.write_i2c_block_data(self.addr, startaddr + i, data[i:i + self.BLOCK_SIZE])
+            self.bus_writes += 1
 
     # display fuction
     # =================================================================
@@ -177,37 +254,34 @@ class RGBStrip():
         Display the rgb datas
 
         :param image: rgb datas, should be a x*3 array 
-        :type image: list [[r, g, b], [r, g, b], ...]
-        """
-        # 'lambda x: x[0]'  same as  'fun(x): return x[0]'
-        reds = list(map(lambda x: x[0], image))
-        greens = list(map(lambda x: x[1], image))
-        blues = list(map(lambda x: x[2], image))
-        revert_image = [reds, greens, blues]
-
-        reg = 0x20  # Register start address of a page
-        empty = 0  # Register address vacancy position (needs to be filled with 0)
-        pos = 0  # data position, index
-
-        for i in range(3):
-            # Set the page to write
-            if i == 0:
-                self.write_cmd(self.CONFIGURE_CMD_PAGE, self.FRAME1_PAGE)  
-            elif reg == 0x20:
-                self.write_cmd(self.CONFIGURE_CMD_PAGE, self.FRAME2_PAGE)
-
-            color = i % 3
-            data = revert_image[color][pos*14:(pos+1)*14]
-            data.insert(empty, 0)  # The written data is filled with 0
-            data.insert(empty + 1, 0)
-
-            self.bus.write_i2c_block_data(self.addr, reg, data)
-            if color == 2:
-                empty += 3
-                pos += 1
-            reg += 0x10
-            if reg == 0xA0:
+        :type image: ndarray or list [[r, g, b], [r, g, b], ...]
+        """
+        image = np.asarray(image, dtype=np.uint8)
+        # one register row per channel on the frame 1 page: r at 0x20,
+        # g at 0x30, b at 0x40, the first 2 registers of a row are not wired,
+        # only the rows that changed are written
+        with self._display_lock:
+            writes = 0
+            try:
                 reg = 0x20
+                for color in range(3):
+                    data = [0, 0] + image[:14, color].tolist()
+                    if data != self._rows[color]:
+                        if self._page != self.FRAME1_PAGE:
+                            self.write_cmd(self.CONFIGURE_CMD_PAGE, self.FRAME1_PAGE)
+                            writes += 1
+                        self.bus.write_i2c_block_data(self.addr, reg, data)
+                        self.bus_writes += 1
+                        writes += 1
+                        self._rows[color] = data
+                    reg += 0x10
+            except Exception:
+                # unknown state after a failed write, rewrite everything next time
+                self._page = None
+                self._rows = [None, None, None]
+                raise
+            # page select and 3 rows without the diff
+            self.writes_saved += 4 - writes
 
     # 
     # calulate rgb data of different styles
@@ -216,8 +290,13 @@ class RGBStrip():
         """
         monochromatic style
         """
-        color = [i*self.brightness for i in color]
-        return color
+        return self._colorize(color, 1)
+
+    def _colorize(self, color, brightness):
+        # brightness (frames, leds) to r, g, b values (frames, leds, 3)
+        color = np.asarray(color, dtype=float) * self._render_brightness
+        data = np.asarray(brightness, dtype=float)[..., np.newaxis] * color
+        return np.clip(data, 0, 255).astype(np.uint8)
 
     def Normal_distribution_calculate(self, u, sig, A, x, offset):
         """
@@ -230,11 +309,11 @@ class RGBStrip():
         :param A: amplitude ratio
         :type  A: float or int
         :param x: x pos
-        :type x: int
+        :type x: int or ndarray
         :param offset: amplitude offset
-        :type offset: float or int
+        :type offset: float, int or ndarray
         :return: Normal distribution y(x)
-        :rtype: float or int
+        :rtype: float or ndarray
         """
         y = A*np.exp(-(x-u)**2/(2*sig**2))/(math.sqrt(2*math.pi)*sig) + offset
         return y
@@ -246,88 +325,82 @@ class RGBStrip():
         :param peak:
         :param a: multiple
         :param x: xpos
-        :return: result, float  or int
+        :return: result, float or ndarray
         """
-        return (peak/2.0) * math.cos(a*x + offset) + peak/2
+        return (peak/2.0) * np.cos(a*x + offset) + peak/2
 
     def breath(self, frame_index, light_index, color='pink', A=5, sig=2):
         """
         breath style, from dark to bright, and then from bright to dark
 
-        :param frame_index: the index of the frame
-        :type frame_index: int
-        :param light_index: the index of the light
-        :type light_index: int
+        :param frame_index: the indexes of the frames, shape (frames, 1)
+        :type frame_index: ndarray
+        :param light_index: the indexes of the lights, shape (1, leds)
+        :type light_index: ndarray
         :param color: rgb display color
         :type color: str , 1*3 list, tuple, eg: "white", "WHITE", "#a2c20c", 0xa2c20c, [168, 192, 203], (168, 192, 203)
         :param A: amplitude ratio
         :type  A: float or int
         :param sig: standard deviation
         :type sig: float or int
-        :return list of 11*[r, g, b] values
-        :rtype: list, 11*[int, int, int]
+        :return: r, g, b values, shape (frames, leds, 3)
+        :rtype: ndarray, uint8
         """
         # https://www.geogebra.org/calculator/qz3vsjjn
         u = 5
-        color = [i*self.brightness for i in color]
         multiple = float(2*math.pi/(self.max_frames)) # multiple, period = max_frames
         offset = -self.cos_func(1, multiple, frame_index)
         brightness = self.Normal_distribution_calculate(u, sig, A, light_index, offset)
-        return list([max(0, int(c * brightness)) for c in color])
+        return self._colorize(color, brightness)
 
     def boom(self, frame_index, light_index, color='pink', A=5, sig=2):
         """
         boom style, from dark to bright (from middle to both sides)
 
-        :param frame_index: the index of the frame
-        :type frame_index: int
-        :param light_index: the index of the light
-        :type light_index: int
+        :param frame_index: the indexes of the frames, shape (frames, 1)
+        :type frame_index: ndarray
+        :param light_index: the indexes of the lights, shape (1, leds)
+        :type light_index: ndarray
         :param color: rgb display color
         :type color: str , 1*3 list, tuple, eg: "white", "WHITE", "#a2c20c", 0xa2c20c, [168, 192, 203], (168, 192, 203)
         :param A: amplitude ratio
         :type  A: float or int
         :param sig: standard deviation
         :type sig: float or int
-        :return: list of 11*[r, g, b] values
-        :rtype: list, 11*[int, int, int]
+        :return: r, g, b values, shape (frames, leds, 3)
+        :rtype: ndarray, uint8
         """
         # https://www.geogebra.org/calculator/gpmxfpks
         u = 5
-        color = [i*self.brightness for i in color]
         multiple = float(2*math.pi/(self.max_frames*2.0)) # multiple, period = 2*max_frames
         offset = -self.cos_func(1, multiple, frame_index)
         brightness = self.Normal_distribution_calculate(u, sig, A, light_index, offset)
-        return list([max(0, int(c * brightness)) for c in color])
+        return self._colorize(color, brightness)
 
     def bark(self, frame_index, light_index, color='pink', A=2.5, sig=1):
         """
         bark style, from middle to both sides
 
-        :param frame_index: the index of the frame
-        :type frame_index: int
-        :param light_index: the index of the light
-        :type light_index: int
+        :param frame_index: the indexes of the frames, shape (frames, 1)
+        :type frame_index: ndarray
+        :param light_index: the indexes of the lights, shape (1, leds)
+        :type light_index: ndarray
         :param color: rgb display color
         :type color: str , 1*3 list, tuple, eg: "white", "WHITE", "#a2c20c", 0xa2c20c, [168, 192, 203], (168, 192, 203)
         :param A: amplitude ratio
         :type  A: float or int
         :param sig: standard deviation
         :type sig: float or int
-        :return: list of 11*[r, g, b] values
-        :rtype: list, 11*[int, int, int]
+        :return: r, g, b values, shape (frames, leds, 3)
+        :rtype: ndarray, uint8
         """
         # https://www.geogebra.org/calculator/yyemmqht
-        color = [i*self.brightness for i in color]
         peak = (self.light_num-1)/2
         multiple = float(2*math.pi/(self.max_frames*2.0)) # multiple, period = 2*max_frames
         u_offset = self.cos_func(peak, multiple, frame_index)
-        if light_index <= peak:
-            u = u_offset 
-        else:
-            u = 2*peak - u_offset
+        u = np.where(light_index <= peak, u_offset, 2*peak - u_offset)
         brightness = self.Normal_distribution_calculate(u, sig, A, light_index, 0)
-        return list([max(0, int(c * brightness)) for c in color])
+        return self._colorize(color, brightness)
 
     def speak(self, frame_index, light_index, color='pink', A=2.5, sig=1):
         """
@@ -335,16 +408,12 @@ class RGBStrip():
 
         """
         # https://www.geogebra.org/calculator/tpzypj5s
-        color = [i*self.brightness for i in color]
         peak = (self.light_num-1)/2
         multiple = float(2*math.pi/(self.max_frames)) # multiple, period = max_frames
         u_offset = self.cos_func(peak, multiple, frame_index)
-        if light_index <= peak:
-            u = u_offset 
-        else:
-            u = 2*peak - u_offset
+        u = np.where(light_index <= peak, u_offset, 2*peak - u_offset)
         brightness = self.Normal_distribution_calculate(u, sig, A, light_index, 0)
-        return list([max(0, int(c * brightness)) for c in color])
+        return self._colorize(color, brightness)
 
     def listen(self, frame_index, light_index, color='pink', A=2.5, sig=1):
         """
@@ -352,13 +421,12 @@ class RGBStrip():
 
         """
         # https://www.geogebra.org/calculator/gwbrzrkt
-        color = [i*self.brightness for i in color]
         peak = self.light_num-1
         multiple = float(2*math.pi/(self.max_frames)) # multiple, period = max_frames
         offset = math.pi/2 # offset left pi/2
         u = self.cos_func(peak, multiple, frame_index, offset)
         brightness = self.Normal_distribution_calculate(u, sig, A, light_index, 0)
-        return list([max(0, int(c * brightness)) for c in color])
+        return self._colorize(color, brightness)
 
     # set mode
     # =================================================================
@@ -399,72 +467,259 @@ class RGBStrip():
         :param brightness: rgb display brightness
         :type brightness: float or int
         """
-        if style in self.STYLES:
-            self.style = style
-        else:
+        if style not in self.STYLES:
             self.style = None
             raise ValueError("Invalid style value.")
-
         color = self.colorConvertor(color)
-        self.color = color
-
-        if isinstance(bps, int) or isinstance(bps, float):
-            self.bps = bps
-        else:
+        if not (isinstance(bps, int) or isinstance(bps, float)):
             raise ValueError("Invalid bps value.")
+        if not (isinstance(brightness, int) or isinstance(brightness, float)):
+            raise ValueError("Invalid brightness value.")
 
-        if isinstance(brightness, int) or isinstance(brightness, float):
+        # same mode, keep the animation running
+        if (style, color, bps, brightness) == (self.style, self.color, self.bps, self.brightness):
+            return
+
+        with self._changed:
+            self.style = style
+            self.color = color
+            self.bps = bps
             self.brightness = brightness
-        else:
+            self.is_changed = True
+            self._changed.notify_all()
+        
+
+    @property
+    def output_brightness(self):
+        return min(self.brightness, self.max_brightness)
+
+    def set_max_brightness(self, max_brightness):
+        '''
+        Cap the brightness of every style, e.g. on low battery
+
+        :param max_brightness: 0 to 1
+        :type max_brightness: float
+        '''
+        if max_brightness != self.max_brightness:
+            with self._changed:
+                self.max_brightness = max_brightness
+                self.is_changed = True
+                self._changed.notify_all()
+
+    def wake(self):
+        '''
+        Make a waiting show() return, e.g. to stop the thread calling it
+        '''
+        with self._changed:
+            self._woken = True
+            self._changed.notify_all()
+
+    # layers
+    # =================================================================
+    def add_layer(self, style, color='white', bps=1, brightness=1, alpha=1.0, duration=None, name=None):
+        """
+        Stack an animation over the base mode and the layers added before,
+        e.g. a short bark flash over a breath
+
+        :param style: rgb display style
+        :type style: str
+        :param color: rgb display color
+        :type color: str , 1*3 list, tuple, eg: "white", "WHITE", "#a2c20c", 0xa2c20c, [168, 192, 203], (168, 192, 203)
+        :param bps: beats per second
+        :type bps: float or int
+        :param brightness: rgb display brightness
+        :type brightness: float or int
+        :param alpha: opacity, 0 to 1, what is below shows through
+        :type alpha: float
+        :param duration: second, removed after, forever if None
+        :type duration: float
+        :param name: replaces the layer of this name, a new name if None
+        :type name: str
+        :return: layer name, for remove_layer()
+        :rtype: str
+        """
+        if style not in self.STYLES:
+            raise ValueError("Invalid style value.")
+        color = self.colorConvertor(color)
+        if not (isinstance(bps, int) or isinstance(bps, float)):
+            raise ValueError("Invalid bps value.")
+        if not (isinstance(brightness, int) or isinstance(brightness, float)):
             raise ValueError("Invalid brightness value.")
+        if not 0 <= alpha <= 1:
+            raise ValueError("Invalid alpha value.")
+
+        with self._changed:
+            if name is None:
+                name = f'layer{next(self._layer_ids)}'
+            layer = Layer(name, style, color, bps, brightness, alpha, time.monotonic(), duration)
+            self._layers = [l for l in self._layers if l.name != name] + [layer]
+            self._woken = True
+            self._changed.notify_all()
+        return name
+
+    def remove_layer(self, name):
+        """
+        Remove a layer added by add_layer(), nothing if it is already gone
 
-        self.is_changed = True
-        
+        :param name: layer name
+        :type name: str
+        """
+        with self._changed:
+            self._layers = [l for l in self._layers if l.name != name]
+            self._woken = True
+            self._changed.notify_all()
+
+    def clear_layers(self):
+        """
+        Remove all the layers, only the base mode is left
+        """
+        with self._changed:
+            self._layers = []
+            self._woken = True
+            self._changed.notify_all()
+
+    @property
+    def layers(self):
+        """
+        Names of the layers, bottom first
+        """
+        return [l.name for l in self._layers]
 
     # calulate and display frames
     # =================================================================
-    def calulate_data(self, frame_index, light_index):
-        if self.style == "monochromatic":
-            return self.monochromatic(color=self.color)
-        elif self.style == 'breath':
-            return self.breath(frame_index, light_index, color=self.color)
-        elif self.style == 'boom':
-            return self.boom(frame_index, light_index, color=self.color)
-        elif self.style == 'bark':
-            return self.bark(frame_index, light_index, color=self.color)
-        elif self.style == 'speak':
-            return self.speak(frame_index, light_index, color=self.color)
-        elif self.style == 'listen':
-            return self.listen(frame_index, light_index, color=self.color)
+    def calulate_data(self, frame_index, light_index, style=None, color=None):
+        style = self.style if style is None else style
+        color = self.color if color is None else color
+        if style == "monochromatic":
+            shape = np.broadcast(frame_index, light_index).shape + (3,)
+            return np.broadcast_to(self.monochromatic(color=color), shape)
+        elif style == 'breath':
+            return self.breath(frame_index, light_index, color=color)
+        elif style == 'boom':
+            return self.boom(frame_index, light_index, color=color)
+        elif style == 'bark':
+            return self.bark(frame_index, light_index, color=color)
+        elif style == 'speak':
+            return self.speak(frame_index, light_index, color=color)
+        elif style == 'listen':
+            return self.listen(frame_index, light_index, color=color)
+
+    def _render(self, style=None, color=None, bps=None, brightness=None):
+        # frames of a mode, the current one by default, from the cache if it was shown recently
+        style = self.style if style is None else style
+        color = self.color if color is None else color
+        bps = self.bps if bps is None else bps
+        if brightness is None:
+            brightness = self.output_brightness
+        else:
+            brightness = min(brightness, self.max_brightness)
+        key = (style, tuple(color), bps, brightness, self.light_num)
+        cached = self._frame_cache.get(key)
+        if cached is not None:
+            self._frame_cache.move_to_end(key)
+            self.frame_cache_hits += 1
+            return cached
+        self.frame_cache_misses += 1
+
+        # the styles use max_frames and _render_brightness
+        self.max_frames = int(1/bps/self.MIN_DELAY)
+        self._render_brightness = brightness
+        frame_index = np.arange(self.max_frames).reshape(-1, 1)
+        light_index = np.arange(self.light_num).reshape(1, -1)
+        # (frames, leds, 3), read only as it is shared by the cache
+        frames = np.array(self.calulate_data(frame_index, light_index, style, color), dtype=np.uint8)
+        frames.flags.writeable = False
+        if __name__ == '__main__':
+            print(frames)
+
+        self._frame_cache[key] = frames, self._holds_of(frames)
+        if len(self._frame_cache) > self.FRAME_CACHE_SIZE:
+            self._frame_cache.popitem(last=False)
+        return self._frame_cache[key]
+
+    @staticmethod
+    def _holds_of(frames):
+        # for each frame, frames until the next different one, cyclic,
+        # len(frames) everywhere if they are all the same
+        n = len(frames)
+        changed = (frames != np.roll(frames, -1, axis=0)).any(axis=(1, 2))
+        if not changed.any():
+            return [n] * n
+        holds = [0] * n
+        last = int(np.flatnonzero(changed)[-1])
+        run = 0
+        for j in range(n):
+            i = (last - j) % n
+            run = 1 if changed[i] else run + 1
+            holds[i] = run
+        return holds
+
+    def _frame_at(self, frames, holds, origin, now):
+        # index of the frame due at `now` in a sequence started at `origin`,
+        # and time.monotonic() of the next different frame, None if static
+        n = len(frames)
+        tick = int((now - origin) / self.MIN_DELAY + 1e-6)
+        index = tick % n
+        if holds[index] >= n:
+            return index, None
+        return index, origin + (tick + holds[index]) * self.MIN_DELAY
 
     def show(self):
-        if self.style is not None:
+        '''
+        Display the frame due now, the base mode with the layers blended over
+        it, then wait until the next different frame is due.
+
+        The frames follow time.monotonic() rather than the number of calls, so
+        the bus time does not slow the animations down, late frames are
+        skipped. Static frames (and a closed strip) wait until set_mode(),
+        set_max_brightness(), a layer change or wake().
+        '''
+        now = time.monotonic()
+        with self._changed:
+            self._woken = False
+            rerender = self.is_changed
+            self.is_changed = False
             # if changed, calulate frames
-            if self.is_changed:
-                self.is_changed = False
-                self.frames.clear()
-                self.max_frames = int(1/self.bps/self.MIN_DELAY)
-                for frame_index in range(self.max_frames):
-                    frame = [] # 11*[r, g ,b]
-                    for light_index in range(self.light_num):
-                        _data = self.calulate_data(frame_index, light_index)
-                        frame.append(_data)
-                    if __name__ == '__main__':
-                        print(f"{frame_index}:{frame}")
-                    self.frames.append(frame)
-            # dispaly frame-by-frame, to quickly change mode or close 
-            if self.current_frame >= self.max_frames:
-                self.current_frame = 0
-            self.display(self.frames[self.current_frame])
-            self.current_frame += 1
-            time.sleep(self.MIN_DELAY)
-        # --- close ---
-        else: 
-            time.sleep(self.MIN_DELAY)
+            if rerender and self.style is not None:
+                self.frames, self._holds = self._render()
+            self._layers = [l for l in self._layers if l.end is None or l.end > now]
+            layers = self._layers
+            style = self.style
+        for layer in layers:
+            if rerender or layer.frames is None:
+                layer.frames, layer.holds = self._render(layer.style, layer.color,
+                                                         layer.bps, layer.brightness)
+
+        deadlines = [layer.end for layer in layers]
+        if style is None:
+            image = np.zeros((self.light_num, 3), dtype=np.uint8)
+        else:
+            self.max_frames = len(self.frames)
+            self.current_frame, deadline = self._frame_at(self.frames, self._holds, self._origin, now)
+            image = self.frames[self.current_frame]
+            deadlines.append(deadline)
+        if len(layers) > 0:
+            image = image.astype(float)
+            for layer in layers:
+                index, deadline = self._frame_at(layer.frames, layer.holds, layer.start, now)
+                image += (layer.frames[index] - image) * layer.alpha
+                deadlines.append(deadline)
+            image = np.rint(image)
+        self.display(image)
+
+        deadlines = [d for d in deadlines if d is not None]
+        with self._changed:
+            timeout = None
+            if len(deadlines) > 0:
+                timeout = max(0, min(deadlines) - time.monotonic())
+            self._changed.wait_for(lambda: self.is_changed or self._woken, timeout)
 
     def close(self):
-        self.style = None
-        self.is_changed = True
+        with self._changed:
+            self.style = None
+            self._layers = []
+            self.is_changed = True
+            self._changed.notify_all()
         self.display([[0, 0, 0]]*self.light_num)
         time.sleep(self.MIN_DELAY)
 
@@ -476,6 +731,7 @@ if __name__ == '__main__':
     # rgb.set_mode(style="bark", color="red", bps=2.5, brightness=1)
     # rgb.set_mode(style="speak", color="magenta", bps=1, brightness=1)
     rgb.set_mode(style="listen", color="cyan", bps=0.5, brightness=1)
+    # rgb.add_layer(style="bark", color="red", bps=2.5, alpha=0.6, duration=2)
     try:
         while True:
             rgb.show()
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+from collections import namedtuple
+from time import time
+
+STATE_FIELDS = (
+    'version',  # incremented on every publish
+    'timestamp',  # time() of the publish
+    # angles of the frame being executed
+    'legs_angles',
+    'head_angles',
+    'tail_angles',
+    # frames queued in the action buffers
+    'legs_depth',
+    'head_depth',
+    'tail_depth',
+    # action buffers drained
+    'legs_done',
+    'head_done',
+    'tail_done',
+    # IMU attitude (degree), raw acc and gyro data, and time() of the sample
+    'pitch',
+    'roll',
+    'yaw',
+    'acc',
+    'gyro',
+    'imu_time',
+    # ultrasonic distance (cm) and time() of the reading
+    'distance',
+    'distance_time',
+    # smoothed battery voltage (V, None before the first read), trend (V/min)
+    # and level, see BatteryMonitor
+    'battery_voltage',
+    'battery_trend',
+    'battery_level',
+)
+
+
+class PidogState(namedtuple('PidogState', STATE_FIELDS)):
+    """
+    Immutable snapshot of the robot state, see Pidog.get_state()
+
+    A new snapshot replaces the previous one after every control tick, so
+    that all the fields of one snapshot are consistent with each other.
+    """
+
+    __slots__ = ()
+
+    @property
+    def all_done(self):
+        return self.legs_done and self.head_done and self.tail_done
+
+    @property
+    def age(self):
+        """
+        Seconds since the snapshot was published, from the caller clock
+        """
+        return time() - self.timestamp
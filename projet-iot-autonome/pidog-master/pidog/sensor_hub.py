@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+import heapq
+import itertools
+import threading
+from collections import namedtuple
+from time import time
+from .events import EventQueue
+
+# sensor: name, value: typed reading below or a plain value,
+# timestamp: time() of the measure
+Sample = namedtuple('Sample', ('sensor', 'value', 'timestamp'))
+# attitude in degree, newest raw acc and gyro data, samples in the batch
+ImuSample = namedtuple('ImuSample', ('roll', 'pitch', 'yaw', 'acc', 'gyro', 'count'))
+# filtered distance in cm, time() of the newest echo
+DistanceSample = namedtuple('DistanceSample', ('distance', 'distance_time'))
+
+
+class _Sensor():
+
+    def __init__(self, name, read=None, rate=0, max_errors=10, on_disable=None):
+        self.name = name
+        self.read = read  # None for the pushed sensors
+        self.rate = rate
+        self.max_errors = max_errors
+        self.on_disable = on_disable
+        self.generation = 0  # invalidates the scheduled reads on rate change
+        self.enabled = True
+        self.samples = 0
+        self.errors = 0
+        self.consecutive_errors = 0
+        self.drops = 0
+        self.overruns = 0
+        self.latency = 0.0  # moving average
+        self.max_latency = 0.0
+        self.achieved_rate = 0.0
+        self._window_start = None
+        self._window_samples = 0
+
+    def count(self, now, latency):
+        self.samples += 1
+        if self._window_start is not None:
+            self._window_samples += 1
+        self.latency += (latency - self.latency) * 0.1
+        self.max_latency = max(self.max_latency, latency)
+        if self._window_start is None:
+            # the first sample starts the rate window
+            self._window_start = now
+        elif now - self._window_start >= 1:
+            self.achieved_rate = self._window_samples / (now - self._window_start)
+            self._window_start = now
+            self._window_samples = 0
+
+
+class SensorHub():
+    """
+    Reads all the polled sensors from one thread, on one schedule
+
+    Every sensor has its own rate, its read function returns a value to
+    publish, or None if nothing new. Sensors driven by interrupts push
+    their values with publish(). Samples go to the callbacks registered
+    with subscribe(), called from the hub thread, and to the bounded
+    queues returned by stream(), which can be read from asyncio.
+    """
+
+    def __init__(self):
+        self._sensors = {}
+        self._schedule = []  # heap of (deadline, seq, name, generation)
+        self._seq = itertools.count()
+        self._condition = threading.Condition()
+        self._subscribers = []  # (callback, sensor)
+        self._streams = []  # (EventQueue, sensor)
+        self.running = False
+        self._thread = None
+
+    def add_sensor(self, name, read, rate, max_errors=10, on_disable=None):
+        '''
+        Poll a sensor
+
+        :param name: sensor name
+        :type name: str
+        :param read: function returning a value to publish, None if nothing new,
+                     raising on error
+        :param rate: reads per second
+        :type rate: float
+        :param max_errors: consecutive errors before the sensor is disabled
+        :type max_errors: int
+        :param on_disable: called from the hub thread with the sensor name and the
+                           last exception when the sensor is disabled
+        '''
+        with self._condition:
+            sensor = _Sensor(name, read, rate, max_errors, on_disable)
+            self._sensors[name] = sensor
+            if rate > 0:
+                self._schedule_read(sensor, time())
+            self._condition.notify()
+
+    def remove_sensor(self, name):
+        with self._condition:
+            self._sensors.pop(name, None)
+
+    def set_rate(self, name, rate):
+        '''
+        Change the reads per second of a polled sensor, 0 pauses it
+        '''
+        with self._condition:
+            sensor = self._sensors[name]
+            sensor.rate = rate
+            sensor.generation += 1
+            if rate > 0:
+                self._schedule_read(sensor, time())
+            self._condition.notify()
+
+    def _schedule_read(self, sensor, deadline):
+        heapq.heappush(self._schedule, (deadline, next(self._seq), sensor.name, sensor.generation))
+
+    def publish(self, name, value, timestamp=None):
+        '''
+        Publish the value of a sensor, used by the sensors driven by interrupts
+
+        :param timestamp: time() of the measure, now if None
+        '''
+        now = time()
+        if timestamp is None:
+            timestamp = now
+        with self._condition:
+            sensor = self._sensors.get(name)
+            if sensor is None:
+                sensor = self._sensors[name] = _Sensor(name)
+            sensor.count(now, now - timestamp)
+        self._dispatch(sensor, Sample(name, value, timestamp))
+
+    def _dispatch(self, sensor, sample):
+        with self._condition:
+            subscribers = [callback for callback, name in self._subscribers
+                           if name is None or name == sample.sensor]
+            streams = [queue for queue, name in self._streams
+                       if name is None or name == sample.sensor]
+        drops = sum(queue.append(sample) for queue in streams)
+        if drops > 0:
+            with self._condition:
+                sensor.drops += drops
+        for callback in subscribers:
+            try:
+                callback(sample)
+            except Exception as e:
+                # imported here, pidog.py imports this module
+                from .pidog import error
+                error(f'\rSensorHub {sample.sensor} subscriber Exception:{e}')
+
+    def subscribe(self, callback, sensor=None):
+        '''
+        Call a function on every sample, from the hub thread, it must return quickly
+
+        :param callback: function taking a Sample
+        :param sensor: only the samples of this sensor, all if None
+        :return: callback, for unsubscribe()
+        '''
+        with self._condition:
+            self._subscribers.append((callback, sensor))
+        return callback
+
+    def unsubscribe(self, callback):
+        with self._condition:
+            self._subscribers = [s for s in self._subscribers if s[0] is not callback]
+            self._streams = [s for s in self._streams if s[0] is not callback]
+
+    def stream(self, sensor=None, maxsize=16):
+        '''
+        Bounded queue of samples, to read with get() or from asyncio with
+        `await stream.aget()` or `async for sample in stream`. When it is
+        full the oldest sample is dropped and counted in the sensor drops.
+
+        :param sensor: only the samples of this sensor, all if None
+        :param maxsize: max samples kept
+        :return: the queue, for unsubscribe()
+        :rtype: EventQueue
+        '''
+        queue = EventQueue(maxsize)
+        with self._condition:
+            self._streams.append((queue, sensor))
+        return queue
+
+    def stats(self, name=None):
+        '''
+        Per-sensor statistics
+
+        :param name: sensor name, all if None
+        :return: samples, achieved rate, target rate (0 for pushed sensors),
+                 latency average and max (read time, or publish delay for
+                 pushed sensors), errors, drops by full streams, late reads
+        :rtype: dict
+        '''
+        with self._condition:
+            sensors = self._sensors if name is None else {name: self._sensors[name]}
+            stats = {sensor.name: {
+                'samples': sensor.samples,
+                'rate': sensor.achieved_rate,
+                'target_rate': sensor.rate,
+                'latency': sensor.latency,
+                'max_latency': sensor.max_latency,
+                'errors': sensor.errors,
+                'drops': sensor.drops,
+                'overruns': sensor.overruns,
+                'enabled': sensor.enabled,
+            } for sensor in sensors.values()}
+        return stats if name is None else stats[name]
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self._thread = threading.Thread(name='sensor_hub_thread', target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        with self._condition:
+            self.running = False
+            self._condition.notify()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+
+    def _next_read(self):
+        # wait for the next due read: sensor, deadline and schedule generation,
+        # None when stopped
+        with self._condition:
+            while self.running:
+                if len(self._schedule) == 0:
+                    self._condition.wait()
+                    continue
+                deadline, _, name, generation = self._schedule[0]
+                sensor = self._sensors.get(name)
+                if sensor is None or sensor.generation != generation or not sensor.enabled:
+                    heapq.heappop(self._schedule)
+                    continue
+                delay = deadline - time()
+                if delay > 0:
+                    self._condition.wait(delay)
+                    continue
+                heapq.heappop(self._schedule)
+                return sensor, deadline, generation
+        return None
+
+    def _run(self):
+        while True:
+            due = self._next_read()
+            if due is None:
+                break
+            sensor, deadline, generation = due
+            start = time()
+            try:
+                value = sensor.read()
+            except Exception as e:
+                value = None
+                sensor.errors += 1
+                sensor.consecutive_errors += 1
+                if sensor.consecutive_errors >= sensor.max_errors:
+                    from .pidog import error
+                    error(f'\rSensorHub {sensor.name} disabled, Exception:{e}')
+                    sensor.enabled = False
+                    if sensor.on_disable is not None:
+                        try:
+                            sensor.on_disable(sensor.name, e)
+                        except Exception as callback_e:
+                            error(f'\rSensorHub {sensor.name} on_disable Exception:{callback_e}')
+            else:
+                sensor.consecutive_errors = 0
+            now = time()
+
+            with self._condition:
+                # set_rate() during the read already scheduled the next one
+                if sensor.rate > 0 and sensor.enabled and sensor.generation == generation:
+                    period = 1 / sensor.rate
+                    deadline += period
+                    if deadline < now:
+                        # skip the missed reads instead of bursting to catch up
+                        sensor.overruns += 1
+                        deadline = now + period
+                    self._schedule_read(sensor, deadline)
+                if value is not None:
+                    sensor.count(now, now - start)
+            if value is not None:
+                self._dispatch(sensor, Sample(sensor.name, value, start))
@@ -1,5 +1,6 @@
 #!/usr/bin/env python3
 import time
+import numpy as np
 from robot_hat import I2C, fileDB
 
 # from filedb import fileDB
@@ -382,6 +383,44 @@ class Sh3001(I2C):
 
     # endregion: Macro Definitions
 
+    ODR_HZ = {
+        SH3001_ODR_1000HZ: 1000,
+        SH3001_ODR_500HZ: 500,
+        SH3001_ODR_250HZ: 250,
+        SH3001_ODR_125HZ: 125,
+        SH3001_ODR_63HZ: 62.5,
+        SH3001_ODR_31HZ: 31.25,
+        SH3001_ODR_16HZ: 15.625,
+        SH3001_ODR_2000HZ: 2000,
+        SH3001_ODR_4000HZ: 4000,
+        SH3001_ODR_8000HZ: 8000,
+        SH3001_ODR_16000HZ: 16000,
+        SH3001_ODR_32000HZ: 32000,
+    }
+
+    # LSB per g
+    ACC_SENSITIVITY = {
+        SH3001_ACC_RANGE_16G: 2048,
+        SH3001_ACC_RANGE_8G: 4096,
+        SH3001_ACC_RANGE_4G: 8192,
+        SH3001_ACC_RANGE_2G: 16384,
+    }
+    # LSB per degree/s
+    GYRO_SENSITIVITY = {
+        SH3001_GYRO_RANGE_125: 262.4,
+        SH3001_GYRO_RANGE_250: 131.2,
+        SH3001_GYRO_RANGE_500: 65.6,
+        SH3001_GYRO_RANGE_1000: 32.8,
+        SH3001_GYRO_RANGE_2000: 16.4,
+    }
+
+    # FIFO frame: acc x,y,z then gyro x,y,z, int16 little endian
+    FIFO_CHANNELS = (SH3001_FIFO_ACC_X_EN | SH3001_FIFO_ACC_Y_EN | SH3001_FIFO_ACC_Z_EN
+                     | SH3001_FIFO_GYRO_X_EN | SH3001_FIFO_GYRO_Y_EN | SH3001_FIFO_GYRO_Z_EN)
+    FIFO_FRAME_SIZE = 12  # bytes
+    FIFO_SIZE = 1024  # bytes
+    I2C_BLOCK_SIZE = 32  # max bytes of one smbus block read
+
     # init
     def __init__(self, db="sh3001.config"):
         super().__init__(address=self.SH3001_ADDRESS)
@@ -402,6 +441,32 @@ class Sh3001(I2C):
         self.gyro_offset = [0, 0, 0]
         self.data_vector = [0, 0, 0]
 
+        self.fifo_enabled = False
+        self.fifo_rate = 0
+        self.fifo_freq = self.SH3001_FIFO_FREQ_X1_2
+        self._fifo_last_time = None
+        # software decimation of the FIFO samples
+        self.decimation = 1
+        self._fifo_pending = None
+
+    @property
+    def sample_rate(self):
+        '''
+        Samples per second returned by read_fifo(), after decimation,
+        or the ODR without FIFO
+        '''
+        if self.fifo_enabled:
+            return self.fifo_rate / self.decimation
+        return self.ODR_HZ[self.odr]
+
+    @property
+    def acc_sensitivity(self):
+        return self.ACC_SENSITIVITY[self.acc_range]
+
+    @property
+    def gyro_sensitivity(self):
+        return self.GYRO_SENSITIVITY[self.gyro_range]
+
     def get_from_config(self, name, default_value=None):
         value = self.db.get(name, default_value)
         value = [float(i.strip()) for i in value.strip("[]").split(",")]
@@ -446,6 +511,11 @@ class Sh3001(I2C):
             raise ValueError('aram must be acc or gyro')
 
     def sh3001_init(self):
+        self.odr = self.SH3001_ODR_500HZ
+        self.acc_range = self.SH3001_ACC_RANGE_2G
+        self.gyro_range = self.SH3001_GYRO_RANGE_2000
+        self.acc_cutoff = self.SH3001_ACC_ODRX025
+        self.gyro_cutoff = self.SH3001_GYRO_ODRX00
         regData = [0]
         i = 0
         while ((regData[0] != 0x61) and (i < 3)):
@@ -455,19 +525,73 @@ class Sh3001(I2C):
                 return False
 
         self.sh3001_module_reset()
-        self.sh3001_acc_config(self.SH3001_ODR_500HZ, self.SH3001_ACC_RANGE_2G,
-                               self.SH3001_ACC_ODRX025,
+        self.sh3001_acc_config(self.odr, self.acc_range,
+                               self.acc_cutoff,
                                self.SH3001_ACC_FILTER_EN)
-        self.sh3001_gyro_config(self.SH3001_ODR_500HZ,
-                                self.SH3001_GYRO_RANGE_2000,
-                                self.SH3001_GYRO_RANGE_2000,
-                                self.SH3001_GYRO_RANGE_2000,
-                                self.SH3001_GYRO_ODRX00,
+        self.sh3001_gyro_config(self.odr,
+                                self.gyro_range,
+                                self.gyro_range,
+                                self.gyro_range,
+                                self.gyro_cutoff,
                                 self.SH3001_GYRO_FILTER_EN)
         self.sh3001_temp_config(self.SH3001_TEMP_ODR_63, self.SH3001_TEMP_EN)
 
         return True
 
+    def configure(self, odr=None, acc_range=None, gyro_range=None, acc_cutoff=None,
+                  gyro_cutoff=None):
+        '''
+        Change the sensor configuration at runtime, None keeps the current value.
+        The FIFO is restarted, emptied of the samples of the old configuration.
+
+        :param odr: output data rate of both sensors, SH3001_ODR_*
+        :param acc_range: SH3001_ACC_RANGE_*
+        :param gyro_range: SH3001_GYRO_RANGE_*
+        :param acc_cutoff: acc low pass cutoff, SH3001_ACC_ODRX*
+        :param gyro_cutoff: gyro low pass cutoff, SH3001_GYRO_ODRX*
+        '''
+        odr = self.odr if odr is None else odr
+        acc_range = self.acc_range if acc_range is None else acc_range
+        gyro_range = self.gyro_range if gyro_range is None else gyro_range
+        acc_cutoff = self.acc_cutoff if acc_cutoff is None else acc_cutoff
+        gyro_cutoff = self.gyro_cutoff if gyro_cutoff is None else gyro_cutoff
+        if odr not in self.ODR_HZ:
+            raise ValueError(f'odr must be one of the SH3001_ODR_* values, not {odr}')
+        if acc_range not in self.ACC_SENSITIVITY:
+            raise ValueError(f'acc_range must be one of the SH3001_ACC_RANGE_* values, not {acc_range}')
+        if gyro_range not in self.GYRO_SENSITIVITY:
+            raise ValueError(f'gyro_range must be one of the SH3001_GYRO_RANGE_* values, not {gyro_range}')
+        if acc_cutoff not in (self.SH3001_ACC_ODRX040, self.SH3001_ACC_ODRX025,
+                              self.SH3001_ACC_ODRX011, self.SH3001_ACC_ODRX004):
+            raise ValueError(f'acc_cutoff must be one of the SH3001_ACC_ODRX* values, not {acc_cutoff}')
+        if gyro_cutoff not in (self.SH3001_GYRO_ODRX00, self.SH3001_GYRO_ODRX01,
+                               self.SH3001_GYRO_ODRX02, self.SH3001_GYRO_ODRX03):
+            raise ValueError(f'gyro_cutoff must be one of the SH3001_GYRO_ODRX* values, not {gyro_cutoff}')
+
+        self.sh3001_acc_config(odr, acc_range, acc_cutoff, self.SH3001_ACC_FILTER_EN)
+        self.sh3001_gyro_config(odr, gyro_range, gyro_range, gyro_range, gyro_cutoff,
+                                self.SH3001_GYRO_FILTER_EN)
+        self.odr = odr
+        self.acc_range = acc_range
+        self.gyro_range = gyro_range
+        self.acc_cutoff = acc_cutoff
+        self.gyro_cutoff = gyro_cutoff
+        if self.fifo_enabled:
+            self.fifo_start(self.fifo_freq)
+
+    def set_decimation(self, ratio):
+        '''
+        Average every `ratio` FIFO samples into one in read_fifo()
+
+        :param ratio: 1 to keep every sample
+        :type ratio: int
+        '''
+        ratio = int(ratio)
+        if ratio < 1:
+            raise ValueError('decimation ratio must be 1 or more')
+        self.decimation = ratio
+        self._fifo_pending = None
+
     def sh3001_module_reset(self):
         # soft reset
         regData = 0x73
@@ -540,8 +664,114 @@ class Sh3001(I2C):
         self.mem_write(regData, self.SH3001_TEMP_CONF0)
         regData = self.mem_read(1, self.SH3001_TEMP_CONF0)
 
+    def sh3001_fifo_reset(self, fifoMode):
+        regData = self.mem_read(1, self.SH3001_FIFO_CONF0)
+        regData[0] |= 0x80
+        self.mem_write(regData, self.SH3001_FIFO_CONF0)
+        regData[0] &= 0x7F
+        self.mem_write(regData, self.SH3001_FIFO_CONF0)
+        self.mem_write(fifoMode & 0x03, self.SH3001_FIFO_CONF0)
+
+    def sh3001_fifo_config(self, fifoMode, fifoAccDownSample, fifoAccFreq,
+                           fifoGyroDownSample, fifoGyroFreq, fifoChannel,
+                           fifoWaterMarkLevel):
+        # register layout of the vendor driver
+        self.mem_write(fifoAccDownSample | (fifoAccFreq << 4) | fifoGyroDownSample | fifoGyroFreq,
+                       self.SH3001_FIFO_CONF4)
+        fifoWaterMarkLevel = min(fifoWaterMarkLevel, self.FIFO_SIZE)
+        self.mem_write(fifoChannel & 0xFF, self.SH3001_FIFO_CONF2)
+        self.mem_write(fifoWaterMarkLevel & 0xFF, self.SH3001_FIFO_CONF1)
+        self.mem_write(((fifoChannel >> 8) & 0x30) | ((fifoWaterMarkLevel >> 8) & 0x07),
+                       self.SH3001_FIFO_CONF3)
+        self.sh3001_fifo_reset(fifoMode)
+
     # endregion: sh3001 internal function
 
+    # FIFO burst reads
+    def fifo_start(self, freq=SH3001_FIFO_FREQ_X1_2):
+        '''
+        Buffer the samples in the chip FIFO (stream mode, the oldest samples
+        are overwritten when full), read them in bulk with read_fifo()
+
+        :param freq: FIFO rate, SH3001_FIFO_FREQ_X1_2 (ODR / 2) to SH3001_FIFO_FREQ_X1_256,
+                     None to store every sample
+        :return: True if the FIFO is configured
+        :rtype: bool
+        '''
+        self.fifo_freq = freq
+        if freq is None:
+            acc_downs = self.SH3001_FIFO_ACC_DOWNS_DIS
+            gyro_downs = self.SH3001_FIFO_GYRO_DOWNS_DIS
+            freq = 0
+            self.fifo_rate = self.ODR_HZ[self.odr]
+        else:
+            acc_downs = self.SH3001_FIFO_ACC_DOWNS_EN
+            gyro_downs = self.SH3001_FIFO_GYRO_DOWNS_EN
+            self.fifo_rate = self.ODR_HZ[self.odr] / 2**(freq + 1)
+        try:
+            self.sh3001_fifo_config(self.SH3001_FIFO_MODE_STREAM, acc_downs, freq,
+                                    gyro_downs, freq, self.FIFO_CHANNELS,
+                                    self.FIFO_SIZE - self.FIFO_FRAME_SIZE)
+        except Exception:
+            self.fifo_enabled = False
+            return False
+        self._fifo_last_time = None
+        self._fifo_pending = None
+        self.fifo_enabled = True
+        return True
+
+    def fifo_stop(self):
+        self.sh3001_fifo_reset(self.SH3001_FIFO_MODE_DIS)
+        self.fifo_enabled = False
+
+    def fifo_count(self):
+        '''
+        Number of bytes in the FIFO
+        '''
+        regData = self.mem_read(2, self.SH3001_FIFO_STA0)
+        return ((regData[1] & 0x1F) << 8) | regData[0]
+
+    def read_fifo(self):
+        '''
+        Drain the complete frames of the FIFO, averaged by blocks of
+        `decimation` frames, the incomplete block is kept for the next read
+
+        :return: timestamps (n,), reconstructed from the FIFO rate,
+                 acc data (n, 3), gyro data (n, 3), or False on I2C error
+        :rtype: tuple of numpy.ndarray
+        '''
+        try:
+            count = self.fifo_count() // self.FIFO_FRAME_SIZE * self.FIFO_FRAME_SIZE
+            now = time.time()
+            data = bytearray()
+            while len(data) < count:
+                data += bytes(self.mem_read(min(self.I2C_BLOCK_SIZE, count - len(data)),
+                                            self.SH3001_FIFO_DATA))
+        except Exception:
+            return False
+
+        frames = np.frombuffer(bytes(data), dtype='<i2').reshape(-1, 6).astype(np.int32)
+        n = len(frames)
+        period = 1.0 / self.fifo_rate
+        last = self._fifo_last_time
+        # the newest frame was sampled right before the read, keep a regular
+        # spacing from the previous batch unless the clocks drifted apart
+        if last is None or n == 0 or abs(last + n * period - now) > 2 * period:
+            last = now - n * period
+        timestamps = last + period * np.arange(1, n + 1)
+        if n > 0:
+            self._fifo_last_time = timestamps[-1]
+        if self.decimation > 1:
+            if self._fifo_pending is not None:
+                timestamps = np.concatenate((self._fifo_pending[0], timestamps))
+                frames = np.concatenate((self._fifo_pending[1], frames))
+            used = len(frames) // self.decimation * self.decimation
+            self._fifo_pending = (timestamps[used:], frames[used:])
+            # block mean, stamped with the time of the last frame of the block
+            frames = frames[:used].reshape(-1, self.decimation, 6).mean(axis=1)
+            timestamps = timestamps[self.decimation-1:used:self.decimation]
+        return timestamps, frames[:, 0:3], frames[:, 3:6]
+
     # return accData,gyroData
     def _sh3001_getimudata(self):
         try:
@@ -30,7 +30,70 @@
 '''
 
 import spidev
-from gpiozero import OutputDevice, InputDevice
+import threading
+from collections import deque
+from time import time
+import numpy as np
+from gpiozero import OutputDevice, DigitalInputDevice
+
+
+class DirectionHistogram():
+    """
+    Decaying circular histogram of sound directions
+
+    One bin per 20 degree step of the module. The bins fade with a half
+    life, so the bearing follows a source that moves and forgets old noise.
+
+    :param half_life: second
+    :type half_life: float
+    """
+
+    BINS = 18
+    BIN_WIDTH = 360 / BINS
+
+    def __init__(self, half_life=2.0):
+        self.half_life = half_life
+        self.weights = np.zeros(self.BINS)
+        self.last_time = None  # time() of the last direction added
+        angles = np.radians(np.arange(self.BINS) * self.BIN_WIDTH)
+        self._unit = np.stack((np.cos(angles), np.sin(angles)), axis=1)
+        self._decay_time = None
+        self._lock = threading.Lock()
+
+    def _decay(self, now):
+        if self._decay_time is not None and now > self._decay_time:
+            self.weights *= 0.5 ** ((now - self._decay_time) / self.half_life)
+        self._decay_time = now if self._decay_time is None else max(now, self._decay_time)
+
+    def add(self, angle, timestamp, weight=1.0):
+        with self._lock:
+            self._decay(timestamp)
+            self.weights[int(round(angle / self.BIN_WIDTH)) % self.BINS] += weight
+            self.last_time = timestamp
+
+    def bearing(self, now=None):
+        '''
+        Weighted circular mean of the directions
+
+        :param now: time() to decay to, now if None
+        :return: bearing in degree (0 to 360), and confidence (0 to 1): the
+                 concentration of the directions times the saturation of
+                 their weight, None, 0 if nothing heard
+        :rtype: tuple
+        '''
+        with self._lock:
+            self._decay(time() if now is None else now)
+            total = self.weights.sum()
+            if total < 1e-3:
+                return None, 0.0
+            x, y = self.weights @ self._unit
+        concentration = np.hypot(x, y) / total
+        confidence = concentration * (1 - np.exp(-total))
+        return float(np.degrees(np.arctan2(y, x)) % 360), float(confidence)
+
+    def clear(self):
+        with self._lock:
+            self.weights[:] = 0
 
 
 class SoundDirection():
@@ -40,12 +103,20 @@ class SoundDirection():
     def __init__(self, busy_pin=6):
         self.spi = spidev.SpiDev()
         self.spi.open(0, 0)
-        #
-        self.busy = InputDevice(busy_pin, pull_up=False)
+        self.spi_lock = threading.Lock()
+        # busy goes low when a direction is detected
+        self.busy = DigitalInputDevice(busy_pin, pull_up=False)
+        self._callbacks = []
+        # tracking mode
+        self.histogram = None
+        self.readings = None
+        self.suppressed = 0
+        self._is_quiet = None
 
     def read(self):
-        result = self.spi.xfer2([0, 0, 0, 0, 0, 0], self.CLOCK_SPEED,
-                                self.CS_DELAY_US)
+        with self.spi_lock:
+            result = self.spi.xfer2([0, 0, 0, 0, 0, 0], self.CLOCK_SPEED,
+                                    self.CS_DELAY_US)
 
 
         l_val, h_val = result[4:]  # ignore the fist two values
@@ -60,6 +131,61 @@ class SoundDirection():
     def isdetected(self):
         return self.busy.value == 0
 
+    def add_callback(self, callback):
+        '''
+        Call a function on every detection, from the busy falling edge
+        instead of polling. The direction is read in the edge callback, so
+        isdetected() and read() polling no longer see the detections.
+
+        :param callback: function taking the angle and time() of the edge
+        '''
+        if len(self._callbacks) == 0:
+            self.busy.when_deactivated = self._on_detected
+        self._callbacks.append(callback)
+
+    def start_tracking(self, half_life=2.0, is_quiet=None, queue_size=32):
+        '''
+        Track the directions from the busy edges: every reading is queued and
+        added to a decaying histogram, see bearing()
+
+        :param half_life: fading of the histogram, second
+        :param is_quiet: function returning False while the readings are
+                         not trusted, e.g. the servos are moving
+        :param queue_size: recent readings kept in self.readings
+        '''
+        if self.histogram is None:
+            self.add_callback(self._track)
+        self.histogram = DirectionHistogram(half_life)
+        self.readings = deque(maxlen=queue_size)
+        self._is_quiet = is_quiet
+
+    def _track(self, angle, timestamp):
+        if self._is_quiet is not None and not self._is_quiet():
+            # self noise of the servos
+            self.suppressed += 1
+            return
+        self.readings.append((angle, timestamp))
+        self.histogram.add(angle, timestamp)
+
+    def bearing(self):
+        '''
+        Stable direction of the tracked sounds, see DirectionHistogram.bearing()
+
+        :return: bearing in degree and confidence, None, 0 if nothing heard
+        :rtype: tuple
+        '''
+        if self.histogram is None:
+            raise RuntimeError('call start_tracking() first')
+        return self.histogram.bearing()
+
+    def _on_detected(self):
+        now = time()
+        val = self.read()
+        if val == -1:
+            return
+        for callback in self._callbacks:
+            callback(val, now)
+
 
 if __name__ == '__main__':
     from time import sleep
@@ -19,6 +19,7 @@ every SECTION devide into 4 STEPs
 import readchar
 from time import sleep as delay
 from math import cos, pi
+from .kinematics import legs_angle_calculation_batch
 
 
 class Trot():
@@ -79,6 +80,16 @@ class Trot():
         self.leg_origin = [self.leg_step_width[i] / 2 + self.y_offset + (
             self.leg_offset[i] * self.LEG_STEP_SCALES[self.lr+1][i]) for i in range(4)]
 
+    @classmethod
+    def gait_params(cls, fb, lr):
+        """
+        All the parameters get_coords() depends on, used as a cache key
+        """
+        return (cls.__name__, fb, lr, cls.SECTION_COUNT, cls.STEP_COUNT,
+                cls.LEG_STEP_HEIGHT, cls.LEG_STEP_WIDTH, cls.CENTER_OF_GRAVITY,
+                cls.LEG_STAND_OFFSET, cls.Z_ORIGIN,
+                tuple(tuple(scales) for scales in cls.LEG_STEP_SCALES))
+
     # Cosine
     def step_y_func(self, leg, step):
         """
@@ -126,6 +137,15 @@ class Trot():
                 leg_coords.append(leg_coord)
         return leg_coords
 
+    def get_angles(self):
+        """
+        get legs angles of every frame, batch inverse kinematics of get_coords()
+
+        :return: shape (frames, 8)
+        :rtype: numpy.ndarray
+        """
+        return legs_angle_calculation_batch(self.get_coords())
+
 
 def test():
 
@@ -166,5 +186,6 @@ def test():
     #     dog.close()
 
 
+# python3 -m pidog.trot
 if __name__ == '__main__':
     test()
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+import threading
+from time import time, sleep
+from multiprocessing import Process, RawArray, Lock
+import numpy as np
+from robot_hat import Pin, Ultrasonic
+
+
+def _median(values):
+    values = sorted(values)
+    n = len(values)
+    if n % 2:
+        return values[n // 2]
+    return (values[n // 2 - 1] + values[n // 2]) / 2
+
+
+class UltrasonicReader():
+    """
+    Ultrasonic distance sampled in a separate process
+
+    The process writes every ping, timestamped, into a ring in shared
+    memory (-1 when no echo came back) and keeps per-second counters.
+    read() filters the latest echoes (median with outlier rejection) and
+    tells when they were measured.
+    A watchdog thread restarts the process if it dies or stops reporting.
+
+    :param trig: trig pin name
+    :type trig: str
+    :param echo: echo pin name
+    :type echo: str
+    :param interval: min time between two pings, second
+    :type interval: float
+    :param timeout: echo timeout, second
+    :type timeout: float
+    """
+
+    CAPACITY = 32  # pings kept in the ring
+    FILTER_SAMPLES = 7  # latest pings filtered by read()
+    FILTER_WINDOW = 0.2  # second, pings older than the newest one by more are ignored
+    OUTLIER_MADS = 3  # echoes further from the median than this many MADs are dropped
+    MAX_ERRORS = 5  # consecutive read errors before the sensor is re-created
+    WATCHDOG_PERIOD = 0.5  # second
+    STALL_TIMEOUT = 2.0  # second without heartbeat before the process is restarted
+    LOCK_TIMEOUT = 0.05  # second, max wait for the lock in read() and stats()
+
+    # shared stats slots
+    HEAD, READS, TIMEOUTS, ERRORS, READ_RATE, TIMEOUT_RATE, HEARTBEAT = range(7)
+
+    def __init__(self, trig='D1', echo='D0', interval=0.01, timeout=0.017):
+        self.trig = trig
+        self.echo = echo
+        self.interval = interval
+        self.timeout = timeout
+
+        # replaced on every process start, a killed process may leave it acquired
+        self._lock = Lock()
+        # (time, distance or -1) pairs and the counters, shared with the process
+        self._ring = RawArray('d', self.CAPACITY * 2)
+        self._stats = RawArray('d', 7)
+        self._samples = np.frombuffer(self._ring).reshape(self.CAPACITY, 2)
+
+        self.process = None
+        # start() and the watchdog both (re)start the process
+        self._process_lock = threading.Lock()
+        self.restarts = 0
+        self.running = False
+        self._watchdog_thread = None
+
+    # process side
+    def _work(self, lock):
+        stats = self._stats
+        sensor = None
+        errors = 0
+        second = time()
+        reads = 0
+        timeouts = 0
+        while True:
+            start = time()
+            distance = None
+            try:
+                if sensor is None:
+                    sensor = Ultrasonic(Pin(self.trig), Pin(self.echo), timeout=self.timeout)
+                distance = float(sensor.read())
+                errors = 0
+            except Exception as e:
+                errors += 1
+                with lock:
+                    stats[self.ERRORS] += 1
+                if errors >= self.MAX_ERRORS:
+                    print(f'\rUltrasonicReader Exception:{e}, re-creating the sensor')
+                    sensor = None
+                    errors = 0
+                    sleep(0.1)
+
+            now = time()
+            with lock:
+                if distance is not None:
+                    # Ultrasonic.read() returns -1 on timeout, kept so that
+                    # read() tells when the obstacle is gone
+                    self._samples[int(stats[self.HEAD]) % self.CAPACITY] = (now, max(distance, -1.0))
+                    stats[self.HEAD] += 1
+                    if distance >= 0:
+                        stats[self.READS] += 1
+                        reads += 1
+                    else:
+                        stats[self.TIMEOUTS] += 1
+                        timeouts += 1
+                stats[self.HEARTBEAT] = now
+                if now - second >= 1:
+                    stats[self.READ_RATE] = reads / (now - second)
+                    stats[self.TIMEOUT_RATE] = timeouts / (now - second)
+                    reads = 0
+                    timeouts = 0
+                    second = now
+
+            remaining = self.interval - (time() - start)
+            if remaining > 0:
+                sleep(remaining)
+
+    # caller side
+    def start(self):
+        '''
+        Start (or restart) the sampling process and its watchdog
+        '''
+        self._start_process()
+        if not self.running:
+            self.running = True
+            self._watchdog_thread = threading.Thread(name='ultrasonic_watchdog',
+                                                     target=self._watchdog)
+            self._watchdog_thread.daemon = True
+            self._watchdog_thread.start()
+
+    def _start_process(self):
+        with self._process_lock:
+            if self.process is not None:
+                self.process.terminate()
+                self.process.join(1)
+            # the old process may have been killed holding the lock
+            self._lock = Lock()
+            self._stats[self.HEARTBEAT] = time()
+            self.process = Process(name='sensory_process', target=self._work, args=(self._lock,))
+            self.process.daemon = True
+            self.process.start()
+
+    def _watchdog(self):
+        while self.running:
+            sleep(self.WATCHDOG_PERIOD)
+            if not self.running:
+                break
+            with self._process_lock:
+                stalled = time() - self._stats[self.HEARTBEAT] > self.STALL_TIMEOUT
+                dead = stalled or not self.process.is_alive()
+            if dead and self.running:
+                print('\rUltrasonicReader process stopped, restarting')
+                self.restarts += 1
+                self._start_process()
+
+    def stop(self):
+        self.running = False
+        with self._process_lock:
+            if self.process is not None:
+                self.process.terminate()
+
+    def read(self):
+        '''
+        Filtered distance of the latest pings
+
+        :return: distance in cm, -1 if most of them got no echo, and time() of
+                 the newest ping, (None, None) before the first ping
+        :rtype: tuple
+        '''
+        lock = self._lock
+        if not lock.acquire(timeout=self.LOCK_TIMEOUT):
+            # process killed holding the lock, until the watchdog restarts it
+            return None, None
+        try:
+            head = int(self._stats[self.HEAD])
+            n = min(head, self.CAPACITY, self.FILTER_SAMPLES)
+            if n == 0:
+                return None, None
+            # newest first
+            indexes = [(head - 1 - i) % self.CAPACITY * 2 for i in range(n)]
+            samples = [(self._ring[i], self._ring[i + 1]) for i in indexes]
+        finally:
+            lock.release()
+
+        # a handful of values, plain python is faster than numpy here
+        newest = samples[0][0]
+        window = [d for t, d in samples if t >= newest - self.FILTER_WINDOW]
+        distances = [d for d in window if d >= 0]
+        if len(distances) * 2 < len(window):
+            # nothing in range
+            return -1.0, float(newest)
+        median = _median(distances)
+        mad = _median([abs(d - median) for d in distances])
+        if mad > 0:
+            # 1.4826 * MAD estimates the standard deviation
+            limit = self.OUTLIER_MADS * 1.4826 * mad
+            median = _median([d for d in distances if abs(d - median) <= limit])
+        return float(median), float(newest)
+
+    def stats(self):
+        '''
+        Counters of the sampling process
+
+        :return: totals of echoes, timeouts and errors, echoes and timeouts
+                 of the last second, restarts, seconds since the last heartbeat
+        :rtype: dict
+        '''
+        lock = self._lock
+        locked = lock.acquire(timeout=self.LOCK_TIMEOUT)
+        # without the lock the counters may be one update behind, still usable
+        stats = list(self._stats)
+        if locked:
+            lock.release()
+        return {
+            'reads': int(stats[self.READS]),
+            'timeouts': int(stats[self.TIMEOUTS]),
+            'errors': int(stats[self.ERRORS]),
+            'read_rate': stats[self.READ_RATE],
+            'timeout_rate': stats[self.TIMEOUT_RATE],
+            'restarts': self.restarts,
+            'heartbeat_age': time() - stats[self.HEARTBEAT],
+        }
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+import threading
+from time import monotonic, sleep
+
+
+class ServoTrack():
+    """
+    Interpolation state of one body part driven by the UnifiedController
+
+    :param name: part name, 'legs', 'head' or 'tail'
+    :param robot: robot_hat Robot of the part
+    :param buffer: ActionBuffer of the part
+    :param get_speed: function returning the current speed of the part, 0-100
+    :param on_frame: called with each frame popped from the buffer,
+                     returns the servo angles to move to
+    :param done_on_pop: mark the frame done when popped instead of when reached,
+                        same as the head and tail action threads
+    """
+
+    def __init__(self, name, robot, buffer, get_speed, on_frame=None, done_on_pop=False):
+        self.name = name
+        self.robot = robot
+        self.buffer = buffer
+        self.get_speed = get_speed
+        self.on_frame = on_frame
+        self.done_on_pop = done_on_pop
+
+        self.steps = [0.0] * robot.pin_num
+        self.remaining = 0
+        self.in_segment = False
+
+    def plan(self, target, period):
+        """
+        Plan the ticks needed to reach target, same timing rules as Robot.servo_move()
+        """
+        speed = max(0, min(100, self.get_speed()))
+        positions = self.robot.servo_positions
+        delta = [target[i] - positions[i] for i in range(self.robot.pin_num)]
+        max_delta = max(abs(d) for d in delta)
+
+        total_time = -9.9 * speed + 1000  # ms
+        if max_delta > 0 and max_delta / total_time * 1000 > self.robot.max_dps:
+            total_time = max_delta / self.robot.max_dps * 1000
+        ticks = max(1, int(total_time / (period * 1000)))
+        if max_delta == 0:
+            ticks = 1
+
+        self.steps = [d / ticks for d in delta]
+        self.remaining = ticks
+        self.in_segment = True
+
+    def next_frame(self, period):
+        """
+        Pop the next frame if the previous one is reached
+
+        :return: True if the part has something to move this tick
+        """
+        if self.remaining > 0:
+            return True
+        if self.in_segment:
+            self.in_segment = False
+            if not self.done_on_pop:
+                self.buffer.task_done()
+        frame = self.buffer.get(timeout=0)
+        if frame is None:
+            return False
+        if self.done_on_pop:
+            self.buffer.task_done()
+        target = list(frame)
+        if self.on_frame is not None:
+            target = self.on_frame(target)
+        self.plan(target, period)
+        return True
+
+    def step(self):
+        """
+        Advance one tick, return the servo positions to write
+        """
+        positions = self.robot.servo_positions
+        for i in range(self.robot.pin_num):
+            positions[i] += self.steps[i]
+        self.remaining -= 1
+        return positions
+
+
+class UnifiedController():
+    """
+    Single fixed-rate control loop for all the servos
+
+    Every tick pops the next frame of each part if needed, interpolates,
+    and writes all the moving servos in one pass, so that whole-body
+    frames stay in sync instead of drifting between three threads.
+
+    :param tracks: list of ServoTrack
+    :param period: tick period, second
+    :param on_tick: called after every tick, including the last one before idling
+    """
+
+    def __init__(self, tracks, period=0.02, on_tick=None):
+        self.tracks = tracks
+        self.period = period
+        self.on_tick = on_tick
+        self.running = False
+        self.thread = None
+        self._wakeup = threading.Event()
+        for track in self.tracks:
+            track.buffer.add_listener(self._wakeup)
+        self._stats_lock = threading.Lock()
+        self.reset_stats()
+
+    def reset_stats(self):
+        with self._stats_lock:
+            self._ticks = 0
+            self._overruns = 0
+            self._jitter_sum = 0.0
+            self._jitter_max = 0.0
+            self._tick_time_max = 0.0
+
+    def stats(self):
+        """
+        Timing statistics of the control loop
+
+        :return: ticks, overruns, mean/max jitter (s), max tick duration (s)
+        :rtype: dict
+        """
+        with self._stats_lock:
+            ticks = self._ticks
+            return {
+                'period': self.period,
+                'ticks': ticks,
+                'overruns': self._overruns,
+                'jitter_mean': self._jitter_sum / ticks if ticks else 0.0,
+                'jitter_max': self._jitter_max,
+                'tick_time_max': self._tick_time_max,
+            }
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(name='control_thread', target=self._loop)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        self._wakeup.set()
+
+    def join(self, timeout=None):
+        if self.thread is not None:
+            self.thread.join(timeout)
+
+    def tick(self):
+        """
+        Run one control tick
+
+        :return: True if any servo moved
+        """
+        writes = []
+        for track in self.tracks:
+            if track.next_frame(self.period):
+                writes.append((track.robot, track.step()))
+        # one write pass for all the moving servos
+        for robot, positions in writes:
+            robot.servo_write_all(positions)
+        if self.on_tick is not None:
+            self.on_tick()
+        return len(writes) > 0
+
+    def _loop(self):
+        deadline = None
+        while self.running:
+            if deadline is None:
+                # idle, block until a frame is queued
+                self._wakeup.wait()
+                self._wakeup.clear()
+                deadline = monotonic()
+                continue
+
+            now = monotonic()
+            if now < deadline:
+                sleep(deadline - now)
+                now = monotonic()
+            jitter = now - deadline
+
+            try:
+                active = self.tick()
+            except Exception as e:
+                # imported here, pidog.py imports this module
+                from .pidog import error
+                error(f'\r_control_thread Exception:{e}')
+                break
+            tick_time = monotonic() - now
+
+            with self._stats_lock:
+                self._ticks += 1
+                self._jitter_sum += jitter
+                self._jitter_max = max(self._jitter_max, jitter)
+                self._tick_time_max = max(self._tick_time_max, tick_time)
+                if jitter + tick_time > self.period:
+                    self._overruns += 1
+
+            if not active:
+                deadline = None
+                continue
+            deadline += self.period
+            # fell more than one tick behind, resync instead of bursting
+            if monotonic() - deadline > self.period:
+                deadline = monotonic()
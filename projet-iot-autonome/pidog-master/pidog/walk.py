@@ -17,6 +17,7 @@ every SECTION devide into 4 STEPs
 #!/usr/bin/env python3
 
 from math import cos, pi
+from .kinematics import legs_angle_calculation_batch
 
 
 class Walk():
@@ -44,14 +45,20 @@ class Walk():
     LEG_STEP_SCALES = [LEG_STEP_SCALES_LEFT,
                        LEG_STEP_SCALES_MIDDLE, LEG_STEP_SCALES_RIGHT]
 
-    def __init__(self, fb, lr):
+    def __init__(self, fb, lr, step_width=None, leg_step_scales=None):
         """
             Walk init
             fb: FORWARD(1) or BACKWARD(-1)
             lr: LEFT(1), STRAIGHT(0) or RIGHT(-1)
+            step_width: width of the stepping leg, LEG_STEP_WIDTH if None
+            leg_step_scales: 4 step width scales, in [-1, 1], overrides lr
         """
         self.fb = fb
         self.lr = lr
+        if step_width is None:
+            step_width = self.LEG_STEP_WIDTH
+        if leg_step_scales is None:
+            leg_step_scales = self.LEG_STEP_SCALES[self.lr+1]
 
         if self.fb == self.FORWARD:
             if self.lr == self.STRAIGHT:
@@ -66,13 +73,46 @@ class Walk():
         else:
             self.y_offset = self.CENTER_OF_GRAVIRTY
         self.leg_step_width = [
-            self.LEG_STEP_WIDTH * self.LEG_STEP_SCALES[self.lr+1][i] for i in range(4)]
+            step_width * leg_step_scales[i] for i in range(4)]
         self.section_length = [self.leg_step_width[i] /
                                (self.SECTION_COUNT-1) for i in range(4)]
         self.step_down_length = [
             self.section_length[i] / self.STEP_COUNT for i in range(4)]
         self.leg_origin = [self.leg_step_width[i] / 2 + self.y_offset + (
-            self.LEG_POSITION_OFFSETS[i] * self.LEG_STEP_SCALES[self.lr+1][i]) for i in range(4)]
+            self.LEG_POSITION_OFFSETS[i] * abs(leg_step_scales[i])) for i in range(4)]
+
+    @classmethod
+    def gait_params(cls, fb, lr):
+        """
+        All the parameters get_coords() depends on, used as a cache key
+        """
+        return (cls.__name__, fb, lr, cls.SECTION_COUNT, cls.STEP_COUNT,
+                cls.LEG_STEP_HEIGHT, cls.LEG_STEP_WIDTH, cls.CENTER_OF_GRAVIRTY,
+                tuple(cls.LEG_POSITION_OFFSETS), cls.Z_ORIGIN,
+                tuple(tuple(scales) for scales in cls.LEG_STEP_SCALES))
+
+    @classmethod
+    def velocity_params(cls, vx, yaw_rate):
+        """
+        Walk parameters of a velocity vector, differential steering of the
+        left and right legs
+
+        :param vx: forward speed, -1 to 1, negative is backward
+        :param yaw_rate: turning speed, -1 to 1, positive turns left
+        :return: fb, step_width, leg_step_scales, or None if not moving
+        :rtype: tuple
+        """
+        left = vx - yaw_rate
+        right = vx + yaw_rate
+        magnitude = max(abs(left), abs(right))
+        if magnitude == 0:
+            return None
+        fb = cls.FORWARD if left + right >= 0 else cls.BACKWARD
+        # the legs step backward when walking backward, flip the scales
+        left = left / magnitude * fb
+        right = right / magnitude * fb
+        step_width = cls.LEG_STEP_WIDTH * min(magnitude, 1)
+        return fb, step_width, (left, right, left, right)
 
     # Cosine
     def step_y_func(self, leg, step):
@@ -120,3 +160,12 @@ class Walk():
                 leg_coords.append(list.copy(leg_coord))
         leg_coords.append(origin_leg_coord)
         return leg_coords
+
+    def get_angles(self):
+        """
+        get legs angles of every frame, batch inverse kinematics of get_coords()
+
+        :return: shape (frames, 8)
+        :rtype: numpy.ndarray
+        """
+        return legs_angle_calculation_batch(self.get_coords())
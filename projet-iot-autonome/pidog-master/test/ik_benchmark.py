@@ -0,0 +1,32 @@
+from pidog import Pidog
+from pidog.walk import Walk
+from pidog.trot import Trot
+from timeit import timeit
+import numpy as np
+
+'''
+Compare the scalar legs_angle_calculation with the batch one
+'''
+
+ROUNDS = 200
+
+gaits = {
+    'forward': Walk(fb=Walk.FORWARD, lr=Walk.STRAIGHT).get_coords(),
+    'turn_left': Walk(fb=Walk.FORWARD, lr=Walk.LEFT).get_coords(),
+    'trot': Trot(fb=Trot.FORWARD, lr=Trot.STRAIGHT).get_coords(),
+}
+
+for name, coords in gaits.items():
+    coords_array = np.array(coords)
+
+    scalar = [Pidog.legs_angle_calculation(coord) for coord in coords]
+    batch = Pidog.legs_angle_calculation_batch(coords_array)
+    max_error = np.max(np.abs(np.array(scalar) - batch))
+
+    t_scalar = timeit(lambda: [Pidog.legs_angle_calculation(coord) for coord in coords], number=ROUNDS)
+    t_batch = timeit(lambda: Pidog.legs_angle_calculation_batch(coords_array), number=ROUNDS)
+
+    print(f"{name:10} {len(coords):3} frames | "
+          f"scalar: {t_scalar/ROUNDS*1000:7.3f} ms | "
+          f"batch: {t_batch/ROUNDS*1000:7.3f} ms | "
+          f"x{t_scalar/t_batch:5.1f} | max error: {max_error:.2e}")
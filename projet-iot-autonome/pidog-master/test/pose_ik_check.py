@@ -0,0 +1,76 @@
+from pidog import Pidog
+from pidog.walk import Walk
+from math import pi, sin, cos, sqrt, acos, atan2
+from time import time
+import itertools
+import numpy as np
+
+'''
+Check pose2legs_angle against the former np.matrix implementation
+for a grid of poses, and time it
+'''
+
+def legacy_pose2legs_angle(dog, legs_list):
+    legpoint_struc = np.asmatrix([
+        [-dog.BODY_WIDTH / 2, -dog.BODY_LENGTH / 2 + legs_list[0][0], dog.body_height - legs_list[0][1]],
+        [dog.BODY_WIDTH / 2, -dog.BODY_LENGTH / 2 + legs_list[1][0], dog.body_height - legs_list[1][1]],
+        [-dog.BODY_WIDTH / 2,  dog.BODY_LENGTH / 2 + legs_list[2][0], dog.body_height - legs_list[2][1]],
+        [dog.BODY_WIDTH / 2,  dog.BODY_LENGTH / 2 + legs_list[3][0], dog.body_height - legs_list[3][1]]
+    ]).T
+    pose = np.asmatrix(dog.pose)
+    body_struct = np.asmatrix(dog.BODY_STRUCT)
+    roll, pitch, yaw = dog.rpy
+    rotx = np.asmatrix([[cos(roll), 0, -sin(roll)], [0, 1, 0], [sin(roll), 0, cos(roll)]])
+    roty = np.asmatrix([[1, 0, 0], [0, cos(-pitch), -sin(-pitch)], [0, sin(-pitch), cos(-pitch)]])
+    rotz = np.asmatrix([[cos(yaw), -sin(yaw), 0], [sin(yaw), cos(yaw), 0], [0, 0, 1]])
+    rot_mat = rotx * roty * rotz
+    AB = np.asmatrix(np.zeros((3, 4)))
+    for i in range(4):
+        AB[:, i] = - pose - rot_mat * body_struct[:, i] + legpoint_struc[:, i]
+    body = (legpoint_struc - AB).T
+    leg = legpoint_struc.T
+
+    angles = []
+    for i in range(4):
+        y = leg[i, 1] - body[i, 1]
+        z = body[i, 2] - leg[i, 2]
+        u = sqrt(y**2 + z**2)
+        beta = acos(min(max((dog.FOOT**2 + dog.LEG**2 - u**2) / (2 * dog.FOOT * dog.LEG), -1), 1))
+        angle2 = acos(min(max((dog.LEG**2 + u**2 - dog.FOOT**2) / (2 * dog.LEG * u), -1), 1))
+        alpha = (angle2 + atan2(y, z) + dog.rpy[1]) / pi * 180
+        beta = beta / pi * 180 - 90
+        if i % 2 != 0:
+            alpha, beta = -alpha, -beta
+        angles += [alpha, beta]
+    return angles
+
+
+my_dog = Pidog()
+
+legs_lists = Walk(fb=Walk.FORWARD, lr=Walk.STRAIGHT).get_coords()[::8]
+angles_range = [-20, -5, 0, 10, 25]
+max_error = 0
+count = 0
+for roll, pitch, yaw in itertools.product(angles_range, repeat=3):
+    for z in [40, 80]:
+        for legs_list in legs_lists:
+            my_dog.set_rpy(roll, pitch, yaw)
+            my_dog.set_pose(5, -5, z)
+            my_dog.set_legs(legs_list)
+            angles = my_dog.pose2legs_angle()
+            expected = legacy_pose2legs_angle(my_dog, legs_list)
+            max_error = max(max_error, np.max(np.abs(np.array(angles) - expected)))
+            count += 1
+
+print(f"{count} poses checked, max error: {max_error:.2e}")
+
+rounds = 2000
+t = time()
+for _ in range(rounds):
+    my_dog.set_rpy(3, -4, 0)
+    my_dog.set_legs(legs_lists[0])
+    my_dog.pose2legs_angle()
+period = (time() - t) / rounds
+print(f"pose2legs_angle: {period*1e6:.1f} us per call, {1/period:.0f} Hz max")
+
+my_dog.close()
@@ -153,12 +153,36 @@ def calculate_direction_from_kx_ky(kx, ky):
     else:
         return "stop", 0
 
+def calculate_velocity_from_kx_ky(kx, ky):
+    """
+    Convertit kx/ky en vecteur vitesse pour my_dog.walk_velocity()
+    ky: avant/arrière, kx: virage (droite positif)
+    """
+    vx = max(-1.0, min(ky, 1.0))
+    yaw_rate = max(-1.0, min(-kx, 1.0))  # yaw_rate positif = virage à gauche
+    return vx, yaw_rate
+
 def autonomous_behavior():
     global autonomous_mode_enabled
     def check_stop():
         with autonomous_lock:
             return not autonomous_mode_enabled
 
+    def battery_rest(active_start):
+        # Repos imposé par le niveau de batterie, False si le mode autonome doit s'arrêter
+        global autonomous_mode_enabled
+        rest = my_dog.autonomous_rest(time.time() - active_start)
+        if rest is None:
+            print('[AUTO] Battery critical, stopping')
+            with autonomous_lock:
+                autonomous_mode_enabled = False
+            return False
+        rest_end = time.time() + rest
+        while time.time() < rest_end:
+            if check_stop(): break
+            sleep(0.2)
+        return True
+
     # Actions statiques (non déplacement)
     static_actions = [
         lambda: my_dog.do_action('bark', speed=100),
@@ -194,7 +218,7 @@ def autonomous_behavior():
                 my_dog.do_action('forward', speed=random.randint(85, 98))
             my_dog.wait_all_done()
             sleep(0.5)
-        if check_stop(): break
+        if check_stop() or not battery_rest(t0): break
 
         # 3. Action statique aléatoire pendant 5s
         action = random.choice(static_actions)
@@ -228,7 +252,7 @@ def autonomous_behavior():
                 my_dog.do_action('forward', speed=random.randint(85, 98))
             my_dog.wait_all_done()
             sleep(0.5)
-        if check_stop(): break
+        if check_stop() or not battery_rest(t0): break
 
         # 6. Action statique aléatoire pendant 5s
         action = random.choice(static_actions)
@@ -267,7 +291,8 @@ def handle_command():
         if autonomous_mode_enabled:
             autonomous_mode_enabled = False
     
-    if not my_dog.is_legs_done():
+    # une marche en cours n'est pas bloquante, move_gait() change d'allure à la volée
+    if not my_dog.is_legs_done() and not my_dog.is_gait_running():
         return jsonify({'status': 'busy', 'message': 'Robot occupé'})
     
     data = request.get_json()
@@ -278,6 +303,8 @@ def handle_command():
         angle = float(data.get('angle', 0))
         intensity = float(data.get('intensity', 0))
         direction, value = calculate_direction_from_angle(angle, intensity)
+        kx = intensity * sin(angle * pi / 180)
+        ky = intensity * cos(angle * pi / 180)
         print(f"HTML Format: angle={angle}°, intensity={intensity} → {direction}")
         
     elif 'kx' in data and 'ky' in data:
@@ -298,18 +325,11 @@ def handle_command():
         return jsonify({'status': 'error', 'message': f'Commande {direction} non reconnue.'})
     
     try:
-        if direction != last_command and last_command not in [None, "stop"]:
-            my_dog.legs_stop()
-            my_dog.wait_all_done()
-        
-        if direction == "forward":
-            my_dog.do_action('forward', speed=speed)
-        elif direction == "backward":
-            my_dog.do_action('backward', speed=speed)
-        elif direction == "turn_left":
-            my_dog.do_action('turn_left', speed=speed)
-        elif direction == "turn_right":
-            my_dog.do_action('turn_right', speed=speed)
+        # Trajectoire continue: la direction sert à la zone morte et au message,
+        # la marche suit le vecteur vitesse du joystick sans arrêt entre les commandes
+        if direction in ["forward", "backward", "turn_left", "turn_right"]:
+            vx, yaw_rate = calculate_velocity_from_kx_ky(kx, ky)
+            my_dog.walk_velocity(vx, yaw_rate, speed=speed, cycles=1)
         elif direction == "stop":
             my_dog.legs_stop()
             my_dog.wait_all_done()